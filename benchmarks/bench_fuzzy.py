@@ -0,0 +1,55 @@
+"""Compare fuzzy matching with and without a DeletionIndex.
+
+    python benchmarks/bench_fuzzy.py --tokens 20000
+"""
+
+import argparse
+import json
+import time
+
+from corpus import make_corpus
+
+from copymatch import make_state, match_text
+from copymatch.copymatch import mk_checker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--length", type=int, default=8)
+    args = parser.parse_args()
+    # Copied passages with a typo every few words.
+    corpus = make_corpus(
+        args.tokens,
+        source_tokens=args.tokens // 4,
+        vocabulary=args.vocabulary,
+        passages=args.tokens // 2000,
+        typo_rate=0.2,
+    )
+    words, source = corpus.analysis, corpus.source
+    base = make_state(words, ngram_size=args.length)
+    for distance in (1, 2):
+        timings = {}
+        for name, vocabulary in (("scan", None), ("deletion_index", base)):
+            start = time.perf_counter()
+            checker = mk_checker(distance, vocabulary=vocabulary)
+            matches = match_text(base, source, checker=checker)
+            timings[name] = time.perf_counter() - start
+        print(
+            json.dumps(
+                {
+                    "distance": distance,
+                    "tokens": args.tokens,
+                    "source_tokens": len(source),
+                    "scan_seconds": round(timings["scan"], 3),
+                    "deletion_index_seconds": round(timings["deletion_index"], 3),
+                    "speedup": round(timings["scan"] / timings["deletion_index"], 1),
+                    "matched_words": len(matches),
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
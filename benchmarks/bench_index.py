@@ -0,0 +1,78 @@
+"""Compare build time and memory of the trie and the rolling-hash index.
+
+Each index is built in a fresh subprocess so peak RSS is not polluted
+by the other run:
+
+    python benchmarks/bench_index.py --tokens 500000
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from corpus import make_corpus
+
+from copymatch import make_state, match_text
+from copymatch.fingerprint import make_index, match_text_index
+
+IMPLS = {
+    "trie": (make_state, match_text),
+    "hash": (make_index, match_text_index),
+}
+
+
+def run(impl: str, tokens: int, ngram_size: int):
+    build, match = IMPLS[impl]
+    # A source made of a few passages copied from the analysis text,
+    # separated by unrelated words.
+    corpus = make_corpus(tokens, source_tokens=tokens // 10, passages=tokens // 10000)
+    words, source = corpus.analysis, corpus.source
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    index = build(words, ngram_size=ngram_size)
+    build_time = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    matches = match(index, source)
+    match_time = time.perf_counter() - start
+    return {
+        "impl": impl,
+        "tokens": tokens,
+        "ngram_size": ngram_size,
+        "build_seconds": round(build_time, 3),
+        "build_rss_mib": round((peak_rss - base_rss) / 1024, 1),
+        "match_seconds": round(match_time, 3),
+        "matched_words": len(matches),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=500000)
+    parser.add_argument("--length", type=int, default=8)
+    parser.add_argument("--impl", choices=IMPLS.keys())
+    args = parser.parse_args()
+    if args.impl is not None:
+        print(json.dumps(run(args.impl, args.tokens, args.length)))
+        return
+    for impl in IMPLS:
+        subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--impl",
+                impl,
+                "--tokens",
+                str(args.tokens),
+                "--length",
+                str(args.length),
+            ],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Time `python -c "import copymatch"` and the first use of the lazy tables.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+SNIPPETS = {
+    "import": "import copymatch",
+    "first_normalize": "import copymatch; copymatch.normalize('x')",
+    "first_lexicon": "import copymatch; copymatch.lexicon()",
+}
+
+
+def time_snippet(code: str, runs: int):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    baseline = time_snippet("pass", args.runs)
+    result = {"interpreter_seconds": round(statistics.median(baseline), 3)}
+    for name, code in SNIPPETS.items():
+        timings = time_snippet(code, args.runs)
+        result[f"{name}_seconds"] = round(statistics.median(timings), 3)
+        result[f"{name}_min_seconds"] = round(min(timings), 3)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Synthetic texts for the benchmarks.
+
+Tokens are drawn from a Zipf-like distribution over a random
+vocabulary, so the n-gram statistics look like natural text without
+needing any real documents. Sources are made of unrelated words with
+passages of the analysis text planted in them, optionally with typos.
+
+    python benchmarks/corpus.py --tokens 100000 --passages 20
+"""
+
+import argparse
+import json
+import random
+import string
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import fitz
+
+from copymatch import PDFWord, Word
+
+
+@dataclass
+class Corpus:
+    analysis: List[Word]
+    source: List[Word]
+    # (source start, analysis start, length) of each planted passage.
+    planted: List[Tuple[int, int, int]] = field(default_factory=list)
+
+
+def make_vocabulary(size: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add(
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+        )
+    return sorted(vocabulary)
+
+
+def synthetic_tokens(
+    count: int, vocabulary: List[str], rng: random.Random
+) -> List[str]:
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    return rng.choices(vocabulary, weights=weights, k=count)
+
+
+def synthetic_words(count: int, vocabulary: int = 20000, seed: int = 0) -> List[Word]:
+    """`count` words over a vocabulary of `vocabulary` tokens."""
+    tokens = synthetic_tokens(count, make_vocabulary(vocabulary), random.Random(seed))
+    return [
+        Word(token=t, pos=pos, ended_in_hyphen=False) for pos, t in enumerate(tokens)
+    ]
+
+
+def typo(token: str, rng: random.Random) -> str:
+    i = rng.randrange(len(token))
+    return token[:i] + rng.choice(string.ascii_lowercase) + token[i + 1 :]
+
+
+def make_corpus(
+    tokens: int,
+    source_tokens: int = 0,
+    vocabulary: int = 20000,
+    passages: int = 10,
+    passage_length: int = 50,
+    typo_rate: float = 0.0,
+    seed: int = 0,
+) -> Corpus:
+    """An analysis text of `tokens` words and a source of
+    `source_tokens` words (a tenth of `tokens` by default) into which
+    `passages` passages of `passage_length` words of the analysis text
+    are copied, each word getting a typo with probability
+    `typo_rate`."""
+    rng = random.Random(seed)
+    vocab = make_vocabulary(vocabulary, seed)
+    if source_tokens == 0:
+        source_tokens = max(tokens // 10, passages * passage_length)
+    analysis = synthetic_tokens(tokens, vocab, rng)
+    source = synthetic_tokens(source_tokens, vocab, rng)
+    planted = []
+    # Evenly spread, so passages never overlap.
+    stride = source_tokens // max(passages, 1)
+    for n in range(min(passages, source_tokens // passage_length)):
+        source_start = n * stride + rng.randrange(max(stride - passage_length, 1))
+        analysis_start = rng.randrange(tokens - passage_length)
+        source[source_start : source_start + passage_length] = [
+            typo(token, rng) if rng.random() < typo_rate else token
+            for token in analysis[analysis_start : analysis_start + passage_length]
+        ]
+        planted.append((source_start, analysis_start, passage_length))
+    return Corpus(
+        analysis=[
+            Word(token=t, pos=pos, ended_in_hyphen=False)
+            for pos, t in enumerate(analysis)
+        ],
+        source=[
+            Word(token=t, pos=pos, ended_in_hyphen=False)
+            for pos, t in enumerate(source)
+        ],
+        planted=planted,
+    )
+
+
+def layout_words(
+    words: List[Word],
+    hyphen_rate: float = 0.02,
+    words_per_line: int = 12,
+    lines_per_page: int = 40,
+    seed: int = 0,
+) -> List[PDFWord]:
+    """Lay `words` out as if extracted from a PDF, with rects, lines
+    and pages, splitting the last word of a line with a hyphen with
+    probability `hyphen_rate`."""
+    rng = random.Random(seed)
+    retval: List[PDFWord] = []
+    line = 0
+    x = 0
+    for word in words:
+        token = word.token
+        pieces = [(token, False)]
+        if x == words_per_line - 1 and len(token) > 3 and rng.random() < hyphen_rate:
+            cut = len(token) // 2
+            pieces = [(token[:cut], True), (token[cut:], False)]
+        for piece, ended_in_hyphen in pieces:
+            page_no, line_no = divmod(line, lines_per_page)
+            retval.append(
+                PDFWord(
+                    token=piece,
+                    pos=len(retval),
+                    ended_in_hyphen=ended_in_hyphen,
+                    rects=(
+                        fitz.Rect(
+                            40 + 40 * x,
+                            40 + 18 * line_no,
+                            75 + 40 * x,
+                            52 + 18 * line_no,
+                        ),
+                        None,
+                    ),
+                    page_no=page_no,
+                    block_no=line_no // 10,
+                    line_no=line_no % 10,
+                    word_no=x,
+                )
+            )
+            x += 1
+            if x == words_per_line:
+                x = 0
+                line += 1
+    return retval
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=100000)
+    parser.add_argument("--source-tokens", type=int, default=0)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--passages", type=int, default=10)
+    parser.add_argument("--passage-length", type=int, default=50)
+    parser.add_argument("--typo-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    corpus = make_corpus(
+        args.tokens,
+        source_tokens=args.source_tokens,
+        vocabulary=args.vocabulary,
+        passages=args.passages,
+        passage_length=args.passage_length,
+        typo_rate=args.typo_rate,
+        seed=args.seed,
+    )
+    print(
+        json.dumps(
+            {
+                "analysis": " ".join(word.token for word in corpus.analysis),
+                "source": " ".join(word.token for word in corpus.source),
+                "planted": corpus.planted,
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
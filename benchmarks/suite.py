@@ -0,0 +1,339 @@
+"""Time each stage of copymatch at several scales on synthetic texts.
+
+Each stage runs at each scale in a fresh subprocess, once with
+tracemalloc to find its peak memory and then --repeat times to time
+it. Results are saved as JSON and two saved runs can be compared:
+
+    python benchmarks/suite.py --scales 10000,100000 -o before.json
+    python benchmarks/suite.py --scales 10000,100000 -o after.json
+    python benchmarks/suite.py --compare before.json after.json
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from corpus import layout_words, make_corpus
+
+from copymatch import (
+    lexicon,
+    make_automaton,
+    make_state,
+    match_text,
+    match_text_automaton,
+    merge_hyphenated,
+    merge_windows,
+    merge_word_rects,
+    normalize,
+    span_words,
+    tokenize,
+)
+from copymatch.copymatch import mk_checker
+from copymatch.fingerprint import make_index, match_text_index
+from copymatch.flat import load_state, match_windows_flat, save_state
+from copymatch.suffix import make_suffix_automaton, match_text_suffix
+from copymatch.text import CHUNK_SIZE, text_words
+from copymatch.vectorized import make_vector_index, match_text_vector
+
+
+@dataclass
+class Stage:
+    # Makes the arguments of `run` from the number of tokens; not timed.
+    setup: Callable[[int], Any]
+    # Runs the stage.
+    run: Callable[[Any], Any]
+    # Largest number of tokens the stage runs at, for the slow ones.
+    max_tokens: int = 1_000_000
+
+
+def corpus(tokens: int, typo_rate: float = 0.0):
+    """An analysis text of `tokens` words and a source of the same
+    size with a passage of 50 copied words every 1000 words."""
+    return make_corpus(
+        tokens,
+        source_tokens=tokens,
+        passages=max(tokens // 1000, 1),
+        typo_rate=typo_rate,
+    )
+
+
+def build_setup(tokens: int):
+    return corpus(tokens).analysis
+
+
+def match_setup(build):
+    def setup(tokens: int):
+        texts = corpus(tokens)
+        return build(texts.analysis, ngram_size=8), texts.source
+
+    return setup
+
+
+def save_setup(tokens: int):
+    path = Path(tempfile.mkdtemp()) / "analysis.trie"
+    save_state(make_state(corpus(tokens).analysis, ngram_size=8), path)
+    return path
+
+
+def flat_setup(tokens: int):
+    texts = corpus(tokens)
+    return load_state(save_setup(tokens), texts.analysis), texts.source
+
+
+def flat_run(args):
+    base, source = args
+    return span_words(base.words, merge_windows(match_windows_flat(base, source)))
+
+
+def fuzzy_setup(tokens: int):
+    texts = corpus(tokens, typo_rate=0.05)
+    return make_state(texts.analysis, ngram_size=8), texts.source
+
+
+def fuzzy_run(args):
+    base, source = args
+    return match_text(base, source, checker=mk_checker(1, vocabulary=base))
+
+
+def layout_setup(tokens: int):
+    # Load the lexicon outside of the timed part.
+    lexicon()
+    return layout_words(corpus(tokens).analysis)
+
+
+def text_setup(tokens: int) -> str:
+    """The analysis text as plain text, in sentences of 12 words, one
+    per line."""
+    tokens_list = [word.token for word in corpus(tokens).analysis]
+    # Load the punctuation table outside of the timed part.
+    tokenize("x")
+    return "\n".join(
+        " ".join(tokens_list[start : start + 12]).capitalize() + "."
+        for start in range(0, len(tokens_list), 12)
+    )
+
+
+def text_run(text: str):
+    # Chunked as if read from a file.
+    return list(
+        text_words(
+            text[start : start + CHUNK_SIZE]
+            for start in range(0, len(text), CHUNK_SIZE)
+        )
+    )
+
+
+def normalize_setup(tokens: int) -> List[str]:
+    return text_setup(tokens).split()
+
+
+def normalize_run(pieces: List[str]):
+    # Each run starts cold, as for the first document of a run.
+    normalize.cache_clear()
+    return list(map(normalize, pieces))
+
+
+STAGES: Dict[str, Stage] = {
+    "make_state": Stage(build_setup, lambda words: make_state(words, ngram_size=8)),
+    "make_automaton": Stage(
+        build_setup, lambda words: make_automaton(words, ngram_size=8)
+    ),
+    "make_index": Stage(build_setup, lambda words: make_index(words, ngram_size=8)),
+    "make_suffix_automaton": Stage(
+        build_setup, lambda words: make_suffix_automaton(words, ngram_size=8)
+    ),
+    "make_vector_index": Stage(
+        build_setup, lambda words: make_vector_index(words, ngram_size=8)
+    ),
+    "match_text": Stage(match_setup(make_state), lambda args: match_text(*args)),
+    "match_text_automaton": Stage(
+        match_setup(make_automaton), lambda args: match_text_automaton(*args)
+    ),
+    "match_text_index": Stage(
+        match_setup(make_index), lambda args: match_text_index(*args)
+    ),
+    "match_text_suffix": Stage(
+        match_setup(make_suffix_automaton), lambda args: match_text_suffix(*args)
+    ),
+    "match_text_vector": Stage(
+        match_setup(make_vector_index), lambda args: match_text_vector(*args)
+    ),
+    "load_state": Stage(save_setup, load_state),
+    "match_text_flat": Stage(flat_setup, flat_run),
+    "fuzzy_match": Stage(fuzzy_setup, fuzzy_run, max_tokens=100_000),
+    "merge_hyphenated": Stage(layout_setup, merge_hyphenated),
+    "merge_word_rects": Stage(layout_setup, merge_word_rects),
+    "normalize": Stage(normalize_setup, normalize_run),
+    "tokenize": Stage(text_setup, tokenize),
+    "text_words": Stage(text_setup, text_run),
+}
+
+
+def run_stage(name: str, tokens: int, repeat: int) -> Dict[str, Any]:
+    stage = STAGES[name]
+    args = stage.setup(tokens)
+    # Memory is measured in a run of its own, as tracing every
+    # allocation slows the stage down.
+    tracemalloc.start()
+    result = stage.run(args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # Number of matches or words, to spot changes in the output.
+    result_size = len(result) if isinstance(result, list) else None
+    del result
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        stage.run(args)
+        timings.append(time.perf_counter() - start)
+    return {
+        "stage": name,
+        "tokens": tokens,
+        "seconds": round(min(timings), 4),
+        "runs": [round(timing, 4) for timing in timings],
+        "peak_mib": round(peak / (1 << 20), 1),
+        "size": result_size,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_suite(scales: List[int], stages: List[str], repeat: int) -> Dict[str, Any]:
+    results = []
+    for tokens in scales:
+        for name in stages:
+            if tokens > STAGES[name].max_tokens:
+                continue
+            out = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--run",
+                    name,
+                    "--tokens",
+                    str(tokens),
+                    "--repeat",
+                    str(repeat),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            # The result is the last line, after anything printed on import.
+            result = json.loads(out.splitlines()[-1])
+            print(json.dumps(result), file=sys.stderr)
+            results.append(result)
+    return {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> bool:
+    """Print how each result of `new_path` compares to `old_path`.
+    Returns whether any got slower or bigger by more than
+    `threshold`."""
+    with open(old_path) as f:
+        old = {(r["stage"], r["tokens"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    regressed = False
+    print(f"{'stage':<22}{'tokens':>9}{'seconds':>20}{'peak MiB':>22}")
+    for result in new:
+        before = old.get((result["stage"], result["tokens"]))
+        if before is None:
+            continue
+        line = f"{result['stage']:<22}{result['tokens']:>9}"
+        for key in ("seconds", "peak_mib"):
+            ratio = result[key] / before[key] if before[key] > 0 else 1.0
+            flag = " "
+            # Ignore noise in tiny numbers.
+            if ratio > 1 + threshold and result[key] - before[key] > 0.01:
+                flag = "!"
+                regressed = True
+            line += f"{before[key]:>9} → {result[key]:<7}{ratio:>5.2f}{flag}"
+        print(line)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales",
+        type=lambda scales: [int(scale) for scale in scales.split(",")],
+        default=[10_000, 100_000, 1_000_000],
+        help="Comma-separated numbers of tokens (default is 10000,100000,1000000).",
+    )
+    parser.add_argument(
+        "--stages",
+        type=lambda stages: stages.split(","),
+        default=list(STAGES),
+        help=f"Comma-separated stages (default is all of {','.join(STAGES)}).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs of each stage; the fastest is reported (default is 3).",
+    )
+    parser.add_argument("-o", "--output", type=str, help="File to save results to.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="Compare two saved results instead of running the suite.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown or growth flagged by --compare (default is 0.1).",
+    )
+    parser.add_argument("--run", choices=STAGES.keys(), help=argparse.SUPPRESS)
+    parser.add_argument("--tokens", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run is not None:
+        print(json.dumps(run_stage(args.run, args.tokens, args.repeat)))
+        return
+    if args.compare is not None:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+    for name in args.stages:
+        if name not in STAGES:
+            parser.error(f"unknown stage {name}")
+    suite = run_suite(args.scales, args.stages, args.repeat)
+    if args.output is None:
+        print(json.dumps(suite, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(suite, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
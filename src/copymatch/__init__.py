@@ -1,4 +1,7 @@
+import contextlib
+import functools
 import hashlib
+import inspect
 import os
 import pickle
 import sqlite3
@@ -7,20 +10,38 @@ import unicodedata
 import zlib
 from collections import deque
 from collections.abc import Container, Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Generator, List, Optional, Tuple
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import fitz
-from nltk.corpus import brown
-from nltk.tokenize import word_tokenize
 from sqlitedict import SqliteDict
 
-from copymatch.parsr import ParsrClient
+from copymatch import stats
+from copymatch.cache import ParsrCache, WordRow
+from copymatch.wordlist import Lexicon, compile_lexicon, is_compiled
 
-PUNCT_TBL = dict.fromkeys(
-    i for i in range(sys.maxunicode) if unicodedata.category(chr(i)).startswith("P")
-)
+PARSR_SERVER = "localhost:3001"
+# Default size limit of the Parsr cache, overridden by the
+# COPYMATCH_PARSR_CACHE_MB environment variable.
+PARSR_CACHE_MB = 1024
+# Number of distinct tokens whose normalized form is remembered. A
+# text of millions of words rarely has more.
+NORMALIZE_CACHE_SIZE = 1 << 17
 
 
 @dataclass(eq=True, frozen=True)
@@ -39,8 +60,6 @@ class PDFWord(Word):
     word_no: int
 
 
-WORDS = set(brown.words())
-
 # https://en.wikipedia.org/wiki/Suffix_tree??
 
 
@@ -52,7 +71,8 @@ class State(Container[str], Iterable[str]):
     length: int = 0
     rect: Optional[fitz.Rect] = None
     prev_state: Optional["State"] = None
-    words: Optional[List[Word]] = None
+    words: Optional[Sequence[Word]] = None
+    fail: Optional["State"] = field(default=None, repr=False, compare=False)
 
     def __contains__(self, term: Any):
         return term in self.transitions
@@ -70,11 +90,99 @@ class State(Container[str], Iterable[str]):
         return self.length
 
 
+def cache_dir() -> Path:
+    path = Path(os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache")))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
 def cache_file() -> Path:
-    return (
-        Path(os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache")))
-        / "copymatch.db"
+    return cache_dir() / "copymatch.db"
+
+
+@contextlib.contextmanager
+def write_cache_file(path: Path) -> Iterator[BinaryIO]:
+    """Binary file that becomes `path` once the block is done."""
+    # Write and rename so concurrent processes never see half a file.
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def write_cache_text(path: Path, text: str):
+    with write_cache_file(path) as f:
+        f.write(text.encode("utf-8"))
+
+
+@functools.cache
+def punct_table() -> Dict[int, None]:
+    """Table for `str.translate` that deletes all punctuation.
+
+    Finding the punctuation means looking at every code point, so the
+    characters are only collected once per Unicode version and kept in
+    the cache directory, if it can be written to.
+    """
+    name = f"punct-{unicodedata.unidata_version}.txt"
+    try:
+        chars = (cache_dir() / name).read_text(encoding="utf-8")
+    except OSError:
+        chars = "".join(
+            chr(i)
+            for i in range(sys.maxunicode)
+            if unicodedata.category(chr(i)).startswith("P")
+        )
+        # Without a cache directory the table is collected again by
+        # the next process, which is only slower.
+        with contextlib.suppress(OSError):
+            write_cache_text(cache_dir() / name, chars)
+    return dict.fromkeys(map(ord, chars))
+
+
+@functools.cache
+def lexicon(paths: Tuple[str, ...] = ()) -> Lexicon:
+    """Words used to decide whether to join the parts of a hyphenated
+    word: those of the word lists at `paths`, or of the Brown corpus
+    if there are none.
+
+    Lexicons are compiled into the cache directory on first use and
+    memory-mapped from there, so large ones load as quickly and are
+    shared between processes.
+    """
+    if len(paths) == 0:
+        path = cache_dir() / f"lexicon-brown-{normalization_version()}.lex"
+        if not path.exists():
+            from nltk.corpus import brown
+
+            compile_lexicon(map(normalize, set(brown.words())), path)
+        return Lexicon(path)
+    return Lexicon(*map(compiled_lexicon, paths))
+
+
+def compiled_lexicon(path: str) -> Path:
+    """Compiled form of the lexicon at `path`, which is either already
+    compiled or a UTF-8 word list with one word per line."""
+    if is_compiled(path):
+        return Path(path)
+    compiled = (
+        cache_dir() / f"lexicon-{hash_path(path)[:16]}-{normalization_version()}.lex"
     )
+    if not compiled.exists():
+        with open(path, encoding="utf-8") as f:
+            compile_lexicon((normalize(line.strip()) for line in f), compiled)
+    return compiled
+
+
+def __getattr__(name: str):
+    # PUNCT_TBL and WORDS used to be built on import.
+    if name == "PUNCT_TBL":
+        return punct_table()
+    if name == "WORDS":
+        return lexicon()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def parse_page_range(page_range: str) -> Generator[int, str, None]:
@@ -87,16 +195,94 @@ def parse_page_range(page_range: str) -> Generator[int, str, None]:
                 yield num
 
 
-def normalize(token: str):
-    return unicodedata.normalize("NFKD", token).casefold().translate(PUNCT_TBL)
+def page_numbers(page_range: str) -> Tuple[int, ...]:
+    """Numbers of the pages in `page_range`, like "3-5,9", counting
+    from 1 as readers do, turned into the page numbers counting from 0
+    that extraction takes."""
+    pages = tuple(sorted({num - 1 for num in parse_page_range(page_range)}))
+    if len(pages) == 0 or pages[0] < 0:
+        raise ValueError(f"Invalid page range {page_range}")
+    return pages
+
+
+def select_pages(path: str, page_count: int, pages: Optional[Tuple[int, ...]]):
+    """Page numbers in `pages` of the PDF at `path`, or all of them if
+    `pages` is None."""
+    if pages is None:
+        return list(range(page_count))
+    if pages[-1] >= page_count:
+        raise ValueError(f"{path} has only {page_count} pages")
+    return list(pages)
+
+
+def normalize_text(text: str) -> str:
+    """Same as `normalize`, for texts of any length, which are neither
+    cached nor interned."""
+    return unicodedata.normalize("NFKD", text).casefold().translate(punct_table())
+
+
+@functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize(token: str) -> str:
+    """Form of `token` that words are matched by.
+
+    The same few thousand tokens make up most of any text, so results
+    are cached, and interned so that every word with the same token
+    shares one string.
+    """
+    return sys.intern(normalize_text(token))
+
+
+@functools.cache
+def normalization_version() -> str:
+    """Digest of the code and data that determine what `normalize`
+    makes of a token, so that lexicons compiled by older code are not
+    used."""
+    hash = hashlib.sha256(unicodedata.unidata_version.encode())
+    funcs: List[Callable[..., Any]] = [punct_table, normalize_text, normalize]
+    for func in funcs:
+        hash.update(inspect.getsource(func).encode())
+    return hash.hexdigest()[:16]
+
+
+@contextlib.contextmanager
+def normalize_stats():
+    """Count the calls to `normalize` within the block that were
+    answered from its cache."""
+    before = normalize.cache_info()
+    try:
+        yield
+    finally:
+        after = normalize.cache_info()
+        stats.count("normalize_cache_hits", after.hits - before.hits)
+        stats.count("normalize_cache_misses", after.misses - before.misses)
+
+
+@dataclass(eq=True, frozen=True)
+class Span:
+    """A maximal run of words of a source text that matches a run of
+    the analysis text word for word. Ends are exclusive and all four
+    are indexes into the word lists, not `Word.pos`."""
+
+    source_start: int
+    source_end: int
+    analysis_start: int
+    analysis_end: int
+
+
+# An n-gram of a source text found in the analysis text: its start and
+# end in the source and everywhere it starts in the analysis.
+Window = Tuple[int, int, List[int]]
 
 
 # Assumption: Original text does not contain repeated bigrams, and if
 # so, which is marked as a match is not defined.
-def make_state(lst: List[Word], ngram_size=8):
-    base = State()
+def make_state(lst: Sequence[Word], ngram_size=8):
+    """Build a trie of every n-gram of `lst`. The root keeps all of
+    `lst` in `words`, and each end state where its n-gram starts in
+    `startpoints`."""
+    base = State(words=lst)
     ptrs: List[Tuple[State, List[Word]]] = [(base, [])]
-    for word in lst:
+    for idx, word in enumerate(lst):
         next_ptrs: List[Tuple[State, List[Word]]] = [(base, [])]
         for ptr, words in ptrs:
             length = 1 + len(ptr)
@@ -106,15 +292,89 @@ def make_state(lst: List[Word], ngram_size=8):
             words.append(word)
             if end_state:
                 ptr[word.token].words.extend(words)
+                ptr[word.token].startpoints.append(idx - ngram_size + 1)
             else:
                 next_ptrs.append((ptr[word.token], words))
         ptrs = next_ptrs
     return base
 
 
-def match_text(base: State, text: List[Word], checker=None):
+def link_failures(base: State) -> State:
+    """Add Aho-Corasick failure links to a trie built by `make_state`.
+
+    Each state's `fail` points at the state for the longest proper
+    suffix of its path that is also in the trie.
+    """
+    queue: deque[State] = deque()
+    for child in base.transitions.values():
+        child.fail = base
+        queue.append(child)
+    while len(queue) > 0:
+        state = queue.popleft()
+        for token, child in state.transitions.items():
+            fail = state.fail
+            while fail is not None and token not in fail:
+                fail = fail.fail
+            child.fail = base if fail is None else fail[token]
+            queue.append(child)
+    return base
+
+
+def make_automaton(lst: Sequence[Word], ngram_size=8):
+    return link_failures(make_state(lst, ngram_size=ngram_size))
+
+
+# All end states sit at depth ngram_size, so the state for the longest
+# matched suffix is the only one that can be an end state and there is
+# no need to follow failure links to collect output.
+def match_windows_automaton(
+    base: State, text: Iterable[Word], checker=None
+) -> Iterator[Window]:
+    """Same as `match_windows`, with one state per token instead of a
+    list."""
+    if checker is not None:
+        raise ValueError("Fuzzy matching requires the trie index.")
+    state = base
+    # Work on the transition dicts directly; this is the hot loop.
+    for idx, word in enumerate(text):
+        token = word.token
+        transitions = state.transitions
+        while token not in transitions and state is not base:
+            state = state.fail or base
+            transitions = state.transitions
+        state = transitions.get(token, base)
+        if state.end_state:
+            yield (idx - state.length + 1, idx + 1, state.startpoints)
+
+
+class TrieState(Protocol):
+    """What matching needs of a state of a trie, be it a `State` or
+    one of a trie saved to a file."""
+
+    @property
+    def end_state(self) -> bool: ...
+
+    @property
+    def length(self) -> int: ...
+
+    @property
+    def startpoints(self) -> List[int]: ...
+
+    def __contains__(self, token: Any) -> bool: ...
+
+    def __getitem__(self, token: str) -> "TrieState": ...
+
+
+def match_windows(
+    base: TrieState, text: Iterable[Word], checker=None
+) -> Iterator[Window]:
+    """Yield a `Window` for every n-gram of `text` in the trie, in the
+    order of `text`.
+
+    Only the analysis text is held in memory, so `text` can be
+    consumed lazily.
+    """
     next_states = [base]
-    retval: List[Word] = []
     # Go through the text
     for idx, word in enumerate(text):
         # In our current states...
@@ -130,14 +390,98 @@ def match_text(base: State, text: List[Word], checker=None):
                 next_state = checker(word.token, state)
             if next_state is not None:
                 if next_state.end_state:
-                    retval.extend(next_state.words)
+                    yield (idx - next_state.length + 1, idx + 1, next_state.startpoints)
                 else:
                     new_next_states.append(next_state)
         next_states = new_next_states
-    return sorted(set(retval), key=lambda word: word.pos)
+
+
+def merge_windows(windows: Iterable[Window]) -> Iterator[Span]:
+    """Join windows, in source order, that follow one another in both
+    texts into spans. Each span is yielded once it cannot grow any
+    further."""
+    # Source and analysis starts of each growing span, by the analysis
+    # start of its last window.
+    growing: Dict[int, Tuple[int, int]] = {}
+    last_start = last_end = -2
+
+    def spans() -> Iterator[Span]:
+        for analysis_last, (source_start, analysis_start) in growing.items():
+            yield Span(
+                source_start,
+                last_end,
+                analysis_start,
+                analysis_last + last_end - last_start,
+            )
+
+    for start, end, analysis_starts in windows:
+        follows = start == last_start + 1
+        grown: Dict[int, Tuple[int, int]] = {}
+        for analysis_start in analysis_starts:
+            if follows and analysis_start - 1 in growing:
+                grown[analysis_start] = growing.pop(analysis_start - 1)
+            else:
+                grown[analysis_start] = (start, analysis_start)
+        yield from spans()
+        growing = grown
+        last_start, last_end = start, end
+    yield from spans()
+
+
+def merge_spans(spans: Iterable[Span]) -> List[Tuple[int, int]]:
+    """The parts of the analysis text covered by `spans`, as sorted,
+    disjoint (start, end) pairs."""
+    retval: List[Tuple[int, int]] = []
+    for start, end in sorted(
+        (span.analysis_start, span.analysis_end) for span in spans
+    ):
+        if len(retval) > 0 and start <= retval[-1][1]:
+            retval[-1] = (retval[-1][0], max(end, retval[-1][1]))
+        else:
+            retval.append((start, end))
+    return retval
+
+
+def span_words(words: Sequence[Word], spans: Iterable[Span]) -> List[Word]:
+    """The words of the analysis text `words` covered by `spans`, in
+    order."""
+    return [word for start, end in merge_spans(spans) for word in words[start:end]]
+
+
+def iter_window_words(
+    words: Sequence[Word], windows: Iterable[Window]
+) -> Iterator[Word]:
+    """Yield each word of the analysis text `words` the first time one
+    of `windows` covers it."""
+    seen: Set[int] = set()
+    for start, end, analysis_starts in windows:
+        for analysis_start in analysis_starts:
+            for idx in range(analysis_start, analysis_start + end - start):
+                if idx not in seen:
+                    seen.add(idx)
+                    yield words[idx]
+
+
+def match_text_automaton(base: State, text: Sequence[Word], checker=None):
+    """Same as `match_text`, with one state per token instead of a list."""
+    # Only the root state, as made by `make_automaton`, has the words.
+    assert base.words is not None
+    return span_words(
+        base.words, merge_windows(match_windows_automaton(base, text, checker=checker))
+    )
+
+
+def match_text(base: State, text: Sequence[Word], checker=None):
+    # Only the root state, as made by `make_state`, has the words.
+    assert base.words is not None
+    return span_words(
+        base.words, merge_windows(match_windows(base, text, checker=checker))
+    )
 
 
 def tokenize(text: str):
+    from nltk.tokenize import word_tokenize
+
     return [
         Word(token=normalize(w), pos=pos, ended_in_hyphen=(w[-1] == "-"))
         for (pos, w) in enumerate(word_tokenize(text))
@@ -157,23 +501,37 @@ def merge_words(a: PDFWord, b: PDFWord):
     )
 
 
-def merge_hyphenated(words: List[PDFWord]) -> List[PDFWord]:
-    todo = deque(words)
-    retval = []
+def iter_merge_hyphenated(
+    words: Iterable[PDFWord], lexicons: Tuple[str, ...] = ()
+) -> Iterator[PDFWord]:
+    """Merge words hyphenated across lines into one where the result
+    is a word of `lexicon(lexicons)`, holding back at most one word at
+    a time. Words on pages that do not follow each other, because the
+    pages between were not extracted, are not merged."""
+    known = lexicon(lexicons)
     last = None
-    while len(todo) > 0:
-        item = todo.popleft()
+    for item in words:
         if last is not None:
-            if (last.token + item.token) in WORDS:
-                retval[-1] = merge_words(last, item)
+            if (last.token + item.token) in known and (
+                item.page_no - last.page_no <= 1
+            ):
+                yield merge_words(last, item)
                 last = None
                 continue
-        retval.append(item)
+            yield last
+            last = None
         if item.ended_in_hyphen:
             last = item
         else:
-            last = None
-    return retval
+            yield item
+    if last is not None:
+        yield last
+
+
+def merge_hyphenated(
+    words: List[PDFWord], lexicons: Tuple[str, ...] = ()
+) -> List[PDFWord]:
+    return list(iter_merge_hyphenated(words, lexicons))
 
 
 def cache_encode(obj):
@@ -184,35 +542,62 @@ def cache_decode(obj):
     return pickle.loads(zlib.decompress(bytes(obj)))
 
 
-def hash_path(path: str) -> str:
-    hash = hashlib.sha256()
+def hash_file(path: str) -> str:
     with open(path, "rb") as f:
-        while block := f.read(4096):
-            hash.update(block)
-    return hash.hexdigest()
+        return hashlib.file_digest(f, "sha256").hexdigest()
 
 
-def parsr(path: str):
-    sum = hash_path(path)
-    with SqliteDict(
-        cache_file(), encode=cache_encode, decode=cache_decode, autocommit=True
-    ) as db:
-        if sum not in db:
-            parsr = ParsrClient("localhost:3001")
-            resultid = parsr.send_document(
-                file_path=path,
-                config_path="defaultConfig.json",
-                wait_till_finished=True,
-            )["server_response"]
-            db[sum] = parsr.get_json(resultid)
-        return db[sum]
+def stat_key(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
 
 
-# https://raw.githubusercontent.com/pd3f/dehyphen/master/dehyphen/scorer.py
+def hash_paths(paths: List[str], jobs: int = 1) -> List[str]:
+    """SHA-256 of each file in `paths`.
 
+    Hashes are remembered by device, inode, size and modification
+    time, so a file is only read again once it has changed. Files
+    that do need hashing are read by `jobs` threads at once.
+    """
+    keys = [stat_key(path) for path in paths]
+    with SqliteDict(cache_file(), tablename="hashes") as db:
+        known = {key: db[key] for key in set(keys) if key in db}
+        todo = {key: path for key, path in zip(keys, paths) if key not in known}
+        stats.count("hashes_cache_hits", len(known))
+        stats.count("hashes_cache_misses", len(todo))
+        with stats.stage("hash"), ThreadPoolExecutor(
+            max_workers=max(jobs, 1)
+        ) as executor:
+            for key, digest in zip(todo, executor.map(hash_file, todo.values())):
+                db[key] = known[key] = digest
+        db.commit()
+    return [known[key] for key in keys]
+
+
+def hash_path(path: str) -> str:
+    return hash_paths([path])[0]
+
+
+def parsr_cache(path: Path) -> ParsrCache:
+    """The `ParsrCache` at `path` of this process.
+
+    SQLite connections must not be used across a fork, so forked
+    workers open their own. The one inherited from the parent is left
+    alone rather than closed.
+    """
+    return process_parsr_cache(path, os.getpid())
+
+
+@functools.cache
+def process_parsr_cache(path: Path, pid: int) -> ParsrCache:
+    max_mb = float(os.environ.get("COPYMATCH_PARSR_CACHE_MB", PARSR_CACHE_MB))
+    return ParsrCache(path, max_bytes=int(max_mb * 2**20))
+
+
+def parsr_word_table(j) -> List[WordRow]:
+    """The words of a Parsr result, with only the fields that
+    `extract_pdf_words_parsr` uses."""
 
-# TODO try https://github.com/pd3f/dehyphen/blob/master/dehyphen/format.py
-def extract_pdf_words_parsr(path: str) -> List[PDFWord]:
     def word_filter(word):
         if word["type"] != "word":
             return False
@@ -220,21 +605,17 @@ def extract_pdf_words_parsr(path: str) -> List[PDFWord]:
             return False
         return True
 
-    def mk_rect(box):
-        return fitz.Rect(box["l"], box["t"], box["l"] + box["w"], box["t"] + box["h"])
-
-    j = parsr(path)
-
-    words = [
-        PDFWord(
-            token=normalize(word["content"]),
-            rects=(mk_rect(word["box"]), None),
-            pos=word["properties"]["order"],
-            word_no=word["properties"]["order"],
-            page_no=page["pageNumber"] - 1,
-            line_no=line["properties"]["order"],
-            block_no=paragraph["properties"]["order"],
-            ended_in_hyphen=(word["content"][-1] == "-"),
+    return [
+        (
+            word["content"],
+            word["box"]["l"],
+            word["box"]["t"],
+            word["box"]["w"],
+            word["box"]["h"],
+            word["properties"]["order"],
+            page["pageNumber"] - 1,
+            line["properties"]["order"],
+            paragraph["properties"]["order"],
         )
         for page in j["pages"]
         for paragraph in page["elements"]
@@ -244,19 +625,102 @@ def extract_pdf_words_parsr(path: str) -> List[PDFWord]:
         for word in line["content"]
         if word_filter(word)
     ]
-    return merge_hyphenated(words)
 
 
-def extract_pdf_words(path: str) -> List[PDFWord]:
-    doc = fitz.open(path)
-    raw_words = [
-        (page_no, word)
-        for (page_no, page) in enumerate(doc)
-        for word in page.get_text("words", sort=True)
-    ]
+def pop_cached_parsr_json(sum: str):
+    # Whole Parsr results used to be cached; convert them rather than
+    # sending the document to Parsr again.
+    with SqliteDict(
+        cache_file(), encode=cache_encode, decode=cache_decode, autocommit=True
+    ) as db:
+        return db.pop(sum, None)
+
+
+def parsr_words(path: str) -> List[WordRow]:
+    """Word table of the Parsr result for the PDF at `path`."""
+    from copymatch.parsr import ParsrClient
+
+    sum = hash_path(path)
+    cache = parsr_cache(cache_file())
+    rows = cache.get(sum)
+    if rows is None:
+        j = pop_cached_parsr_json(sum)
+        if j is None:
+            with stats.stage("parsr", path=path):
+                parsr = ParsrClient(PARSR_SERVER)
+                resultid = parsr.send_document(
+                    file_path=path,
+                    config_path="defaultConfig.json",
+                    wait_till_finished=True,
+                )["server_response"]
+                j = parsr.get_json(resultid)
+        rows = parsr_word_table(j)
+        cache.put(sum, rows)
+    return rows
+
+
+# https://raw.githubusercontent.com/pd3f/dehyphen/master/dehyphen/scorer.py
+
+
+# TODO try https://github.com/pd3f/dehyphen/blob/master/dehyphen/format.py
+def extract_pdf_words_parsr(
+    path: str, lexicons: Tuple[str, ...] = (), pages: Optional[Tuple[int, ...]] = None
+) -> List[PDFWord]:
+    # Parsr processes whole documents, so other pages are only left out
+    # afterwards.
+    rows = parsr_words(path)
+    if pages is not None:
+        wanted = set(pages)
+        rows = [row for row in rows if row[6] in wanted]
     words = [
         PDFWord(
-            token=normalize(word[4]),
+            token=normalize(content),
+            rects=(fitz.Rect(left, top, left + width, top + height), None),
+            pos=word_order,
+            word_no=word_order,
+            page_no=page_no,
+            line_no=line_order,
+            block_no=paragraph_order,
+            ended_in_hyphen=(content[-1] == "-"),
+        )
+        for (
+            content,
+            left,
+            top,
+            width,
+            height,
+            word_order,
+            page_no,
+            line_order,
+            paragraph_order,
+        ) in rows
+    ]
+    return merge_hyphenated(words, lexicons)
+
+
+def iter_page_words(doc: fitz.Document, page_nos: Iterable[int]):
+    """Yield the raw words of pages `page_nos` of `doc`, with their page
+    numbers and normalized tokens, loading one page at a time. Other
+    pages are never loaded."""
+    for page_no in page_nos:
+        for word in doc[page_no].get_text("words", sort=True):
+            yield (page_no, word, normalize(word[4]))
+
+
+def extract_page_words(path: str, page_nos: List[int]):
+    """Raw words of pages `page_nos` of the PDF at `path`, with their
+    page numbers and normalized tokens."""
+    return list(iter_page_words(fitz.open(path), page_nos))
+
+
+def make_pdf_words(raw_words: Iterable) -> Iterator[PDFWord]:
+    """Turn the raw words of a whole document into `PDFWord`s,
+    numbering them and dropping those without a token."""
+    for pos, (page_no, word, token) in enumerate(raw_words):
+        if token == "":
+            continue
+        yield PDFWord(
+            token=token,
             pos=pos,
             rects=(fitz.Rect(word[0:4]), None),
             page_no=page_no,
@@ -265,17 +729,210 @@ def extract_pdf_words(path: str) -> List[PDFWord]:
             word_no=word[7],
             ended_in_hyphen=(word[4][-1] == "-"),
         )
-        for (pos, (page_no, word)) in enumerate(raw_words)
-    ]
-    return merge_hyphenated([word for word in words if word.token != ""])
 
 
-def merge_word_rects(words: List[PDFWord]):
+def iter_pdf_words(
+    path: str, lexicons: Tuple[str, ...] = (), pages: Optional[Tuple[int, ...]] = None
+) -> Iterator[PDFWord]:
+    """Same words as `extract_pdf_words`, yielded page by page as they
+    are extracted."""
+    doc = fitz.open(path)
+    page_nos = select_pages(path, doc.page_count, pages)
+    return iter_merge_hyphenated(
+        make_pdf_words(iter_page_words(doc, page_nos)), lexicons
+    )
+
+
+def extract_pdf_words(
+    path: str,
+    jobs: int = 1,
+    lexicons: Tuple[str, ...] = (),
+    pages: Optional[Tuple[int, ...]] = None,
+) -> List[PDFWord]:
+    """Extract the words of the PDF at `path`, joining hyphenated words
+    found in `lexicon(lexicons)`. Only the pages numbered in `pages`,
+    counting from 0, are extracted if it is given; `page_no` stays the
+    number of the page in the whole document.
+
+    With `jobs` above 1, pages are extracted in chunks by that many
+    worker processes, each opening the file itself. Positions and
+    hyphenation are only worked out once the chunks are put back
+    together, so the result does not depend on `jobs`.
+    """
+    page_nos = select_pages(path, fitz.open(path).page_count, pages)
+    if jobs <= 1 or len(page_nos) <= 1:
+        raw_words = extract_page_words(path, page_nos)
+    else:
+        # Several chunks per worker evens out pages of different sizes.
+        chunk_size = -(-len(page_nos) // (jobs * 4))
+        chunks = [
+            page_nos[start : start + chunk_size]
+            for start in range(0, len(page_nos), chunk_size)
+        ]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            raw_words = [
+                raw_word
+                for chunk in executor.map(
+                    extract_page_words, [path] * len(chunks), chunks
+                )
+                for raw_word in chunk
+            ]
+    return list(iter_merge_hyphenated(make_pdf_words(raw_words), lexicons))
+
+
+# Bump when extraction changes in a way extraction_version cannot see.
+EXTRACTION_VERSION = 1
+
+
+@functools.cache
+def extraction_version(extractor: str, lexicons: Tuple[str, ...] = ()) -> str:
+    """Digest of the code and data that determine the words `extractor`
+    produces with `lexicons`, so that word lists cached by older code
+    or with other lexicons are not used."""
+    funcs: List[Callable[..., Any]] = [
+        normalize_text,
+        normalize,
+        merge_words,
+        iter_merge_hyphenated,
+        merge_hyphenated,
+    ]
+    if extractor == "parsr":
+        funcs.extend([parsr_word_table, extract_pdf_words_parsr])
+    else:
+        funcs.extend([select_pages, iter_page_words, make_pdf_words, extract_pdf_words])
+    hash = hashlib.sha256(
+        f"{EXTRACTION_VERSION}:{extractor}:{unicodedata.unidata_version}".encode()
+    )
+    hash.update(fitz.VersionBind.encode())
+    for path in lexicons:
+        hash.update(hash_path(path).encode())
+    for func in funcs:
+        hash.update(inspect.getsource(func).encode())
+    return hash.hexdigest()[:16]
+
+
+def words_cache_key(
+    path: str,
+    extractor: str,
+    lexicons: Tuple[str, ...] = (),
+    pages: Optional[Tuple[int, ...]] = None,
+) -> str:
+    version = extraction_version(extractor, lexicons)
+    key = f"{extractor}:{version}:{hash_path(path)}"
+    if pages is not None:
+        key += ":" + ",".join(map(str, pages))
+    return key
+
+
+def cached_words(key: str) -> Optional[List[PDFWord]]:
+    with SqliteDict(
+        cache_file(), tablename="words", encode=cache_encode, decode=cache_decode
+    ) as db:
+        words = db.get(key)
+    stats.count("words_cache_misses" if words is None else "words_cache_hits")
+    return words
+
+
+def extract_words(
+    path: str,
+    extractor: str = "pymupdf",
+    jobs: int = 1,
+    cache: bool = True,
+    lexicons: Tuple[str, ...] = (),
+    pages: Optional[Tuple[int, ...]] = None,
+) -> Sequence[Word]:
+    """Extract the words of the PDF at `path` using `extractor`, either
+    "pymupdf" or "parsr", joining hyphenated words found in
+    `lexicon(lexicons)`, from the pages in `pages` or all of them.
+
+    Results are cached by the content of the file, so an unchanged
+    file is only ever extracted once.
+
+    Plain text and HTML files are split into words directly instead,
+    which is about as fast as reading them from the cache. Their words
+    are not merged like hyphenated ones: the lines of such files are
+    not broken by a typesetter, so a word ending in a hyphen there, as
+    in "pre- and post-war", was written that way.
+    """
+    from copymatch.text import extract_text_words, is_text_source
+
+    if is_text_source(path):
+        if pages is not None:
+            raise ValueError(f"{path} has no pages")
+        with stats.stage("extract", path=path, extractor="text"):
+            text_words = extract_text_words(path)
+        stats.count("tokens", len(text_words), path=path)
+        return text_words
+    if extractor not in ("pymupdf", "parsr"):
+        raise ValueError(f"Unknown extractor {extractor}")
+    key = words_cache_key(path, extractor, lexicons, pages) if cache else None
+    words = None if key is None else cached_words(key)
+    if words is None:
+        with stats.stage("extract", path=path, extractor=extractor), normalize_stats():
+            if extractor == "parsr":
+                words = extract_pdf_words_parsr(path, lexicons, pages)
+            else:
+                words = extract_pdf_words(
+                    path, jobs=jobs, lexicons=lexicons, pages=pages
+                )
+        if key is not None:
+            with SqliteDict(
+                cache_file(),
+                tablename="words",
+                encode=cache_encode,
+                decode=cache_decode,
+                autocommit=True,
+            ) as db:
+                db[key] = words
+    stats.count("tokens", len(words), path=path)
+    return words
+
+
+def iter_extract_words(
+    path: str,
+    extractor: str = "pymupdf",
+    cache: bool = True,
+    lexicons: Tuple[str, ...] = (),
+    pages: Optional[Tuple[int, ...]] = None,
+) -> Iterator[Word]:
+    """Same words as `extract_words`, but extracted with pymupdf page by
+    page as they are consumed.
+
+    Cached words are still used, but words extracted this way are not
+    cached, as that would mean holding all of them at once. Parsr
+    results come in whole documents anyway and go through
+    `extract_words`. Plain text and HTML files are read a chunk at a
+    time.
+    """
+    from copymatch.text import is_text_source, iter_text_file_words
+
+    if is_text_source(path):
+        if pages is not None:
+            raise ValueError(f"{path} has no pages")
+        yield from iter_text_file_words(path)
+        return
+    if extractor == "parsr":
+        yield from extract_words(
+            path, extractor, cache=cache, lexicons=lexicons, pages=pages
+        )
+        return
+    if extractor != "pymupdf":
+        raise ValueError(f"Unknown extractor {extractor}")
+    key = words_cache_key(path, extractor, lexicons, pages)
+    words = cached_words(key) if cache else None
+    if words is not None:
+        yield from words
+        return
+    with normalize_stats():
+        yield from iter_pdf_words(path, lexicons, pages)
+
+
+def merge_word_rects(words: Iterable[PDFWord]):
     retval: List[fitz.Rect] = []
     last_word: Optional[PDFWord] = None
     for word in words:
         if len(retval) == 0:
-            retval.append(word.rects[0])
+            retval.append(fitz.Rect(word.rects[0]))
             if word.rects[1] is not None:
                 retval.append(word.rects[1])
         else:
@@ -288,7 +945,9 @@ def merge_word_rects(words: List[PDFWord]):
             ):
                 retval[-1].include_rect(word.rects[0])
             else:
-                retval.append(word.rects[0])
+                # A copy, as the last rect may be grown to include the
+                # next word.
+                retval.append(fitz.Rect(word.rects[0]))
                 if word.rects[1] is not None:
                     retval.append(word.rects[1])
             last_word = word
@@ -0,0 +1,140 @@
+import csv
+import json
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+
+from copymatch import Span, Window, Word, merge_spans, merge_windows
+from copymatch.fingerprint import NgramIndex, index_ngrams, match_windows_index
+
+
+@dataclass
+class Corpus:
+    """One hash index of the n-grams of many texts.
+
+    The ids of all texts are concatenated, each followed by a -1 so no
+    n-gram runs from one text into the next. `offsets` holds where
+    each text starts.
+    """
+
+    index: NgramIndex
+    offsets: List[int] = field(default_factory=list)
+
+
+@dataclass(eq=True, frozen=True)
+class Overlap:
+    """The text of document `a` found in document `b`. The spans have
+    `a` as their source and `b` as their analysis text."""
+
+    a: int
+    b: int
+    a_tokens: int
+    b_tokens: int
+    spans: List[Span]
+
+
+def make_corpus(docs: List[List[Word]], ngram_size=8) -> Corpus:
+    corpus = Corpus(NgramIndex(words=[], ngram_size=ngram_size))
+    vocabulary = corpus.index.vocabulary
+    for words in docs:
+        corpus.offsets.append(len(corpus.index.ids))
+        for word in words:
+            corpus.index.ids.append(vocabulary.setdefault(word.token, len(vocabulary)))
+        corpus.index.ids.append(-1)
+    index_ngrams(corpus.index)
+    return corpus
+
+
+def match_corpus(
+    corpus: Corpus, text: Iterable[Word], exclude: Optional[int] = None
+) -> Dict[int, List[Span]]:
+    """Spans of `text` found in each text of `corpus` but the one
+    numbered `exclude`, keyed by the number of that text."""
+    windows: Dict[int, List[Window]] = defaultdict(list)
+    for start, end, analysis_starts in match_windows_index(corpus.index, text):
+        doc_starts: Dict[int, List[int]] = defaultdict(list)
+        for analysis_start in analysis_starts:
+            doc = bisect_right(corpus.offsets, analysis_start) - 1
+            if doc == exclude:
+                continue
+            doc_starts[doc].append(analysis_start - corpus.offsets[doc])
+        for doc, starts in doc_starts.items():
+            windows[doc].append((start, end, starts))
+    return {
+        doc: list(merge_windows(doc_windows)) for doc, doc_windows in windows.items()
+    }
+
+
+def transpose(span: Span) -> Span:
+    """The same span, with source and analysis text swapped."""
+    return Span(
+        span.analysis_start, span.analysis_end, span.source_start, span.source_end
+    )
+
+
+def covered(spans: Iterable[Span]) -> int:
+    """Number of words of the analysis text covered by `spans`."""
+    return sum(end - start for start, end in merge_spans(spans))
+
+
+def compare_all(
+    corpus: Corpus, docs: List[List[Word]], count: int
+) -> Iterator[Overlap]:
+    """Yield the overlap of each of the first `count` of `docs` with
+    every other document of `corpus`, which was made from `docs`."""
+    for a in range(count):
+        for b, spans in sorted(match_corpus(corpus, docs[a], exclude=a).items()):
+            yield Overlap(
+                a,
+                b,
+                covered(transpose(span) for span in spans),
+                covered(spans),
+                spans,
+            )
+
+
+def write_json(
+    f: IO[str], documents: List[Dict], overlaps: List[Overlap], ngram_size: int
+):
+    json.dump(
+        {
+            "ngram_size": ngram_size,
+            "documents": documents,
+            "overlaps": [
+                {
+                    "a": overlap.a,
+                    "b": overlap.b,
+                    "a_tokens": overlap.a_tokens,
+                    "b_tokens": overlap.b_tokens,
+                    "spans": [
+                        [
+                            span.source_start,
+                            span.source_end,
+                            span.analysis_start,
+                            span.analysis_end,
+                        ]
+                        for span in overlap.spans
+                    ],
+                }
+                for overlap in overlaps
+            ],
+        },
+        f,
+    )
+    f.write("\n")
+
+
+def write_csv(f: IO[str], documents: List[Dict], overlaps: List[Overlap], count: int):
+    """Write a matrix with a row for each of the first `count`
+    documents and a column for every document, holding the number of
+    words of the row's document found in the column's."""
+    matrix: List[List[object]] = [
+        ["" if a == b else 0 for b in range(len(documents))] for a in range(count)
+    ]
+    for overlap in overlaps:
+        matrix[overlap.a][overlap.b] = overlap.a_tokens
+    writer = csv.writer(f)
+    writer.writerow(["document", "words", *(doc["path"] for doc in documents)])
+    for a, row in enumerate(matrix):
+        writer.writerow([documents[a]["path"], documents[a]["words"], *row])
@@ -0,0 +1,146 @@
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# content, left, top, width, height, word order, page number, line
+# order, paragraph order
+WordRow = Tuple[str, float, float, float, float, int, int, int, int]
+
+HEADER = struct.Struct("<QQ")
+
+
+def encode_word_table(rows: List[WordRow]) -> bytes:
+    """Pack a word table into compressed contiguous arrays, which is
+    much quicker to load than a pickle of the same rows."""
+    contents = [row[0].encode() for row in rows]
+    lengths = array("I", [len(content) for content in contents])
+    floats = array("d", [value for row in rows for value in row[1:5]])
+    ints = array("i", [value for row in rows for value in row[5:9]])
+    text = b"".join(contents)
+    return zlib.compress(
+        b"".join(
+            [
+                HEADER.pack(len(rows), len(text)),
+                lengths.tobytes(),
+                text,
+                floats.tobytes(),
+                ints.tobytes(),
+            ]
+        ),
+        1,
+    )
+
+
+def decode_word_table(data: bytes) -> List[WordRow]:
+    data = zlib.decompress(data)
+    count, text_size = HEADER.unpack_from(data)
+    offset = HEADER.size
+    lengths = array("I")
+    lengths.frombytes(data[offset : offset + count * lengths.itemsize])
+    offset += count * lengths.itemsize
+    text = data[offset : offset + text_size]
+    offset += text_size
+    floats = array("d")
+    floats.frombytes(data[offset : offset + 4 * count * floats.itemsize])
+    offset += 4 * count * floats.itemsize
+    ints = array("i")
+    ints.frombytes(data[offset : offset + 4 * count * ints.itemsize])
+    rows: List[WordRow] = []
+    start = 0
+    for i, length in enumerate(lengths):
+        left, top, width, height = floats[4 * i : 4 * i + 4]
+        word_order, page_no, line_order, paragraph_order = ints[4 * i : 4 * i + 4]
+        rows.append(
+            (
+                text[start : start + length].decode(),
+                left,
+                top,
+                width,
+                height,
+                word_order,
+                page_no,
+                line_order,
+                paragraph_order,
+            )
+        )
+        start += length
+    return rows
+
+
+class ParsrCache:
+    """Word tables of Parsr results, keyed by the hash of the file.
+
+    Keeps a single connection open for the life of the process. When
+    `max_bytes` is set, the least recently used tables are evicted to
+    stay under it.
+    """
+
+    def __init__(self, path: Path, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS parsr_words ("
+                " key TEXT PRIMARY KEY,"
+                " data BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " used INTEGER NOT NULL)"
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS parsr_words_used ON parsr_words (used)"
+            )
+
+    def get(self, key: str) -> Optional[List[WordRow]]:
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT data FROM parsr_words WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute(
+                "UPDATE parsr_words SET used = ? WHERE key = ?", (time.time_ns(), key)
+            )
+        return decode_word_table(row[0])
+
+    def put(self, key: str, rows: List[WordRow]):
+        data = encode_word_table(rows)
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO parsr_words VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time_ns()),
+            )
+            self.evict()
+
+    def evict(self):
+        if self.max_bytes is None:
+            return
+        (total,) = self.db.execute(
+            "SELECT coalesce(sum(size), 0) FROM parsr_words"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute(
+            "SELECT key, size FROM parsr_words ORDER BY used"
+        ).fetchall():
+            self.db.execute("DELETE FROM parsr_words WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def close(self):
+        self.db.close()
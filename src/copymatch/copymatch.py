@@ -1,18 +1,64 @@
 import argparse
+import contextlib
+import functools
 import itertools
+import json
+import multiprocessing
 import os
-from typing import Tuple
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import fitz
 import Levenshtein
 
 from copymatch import (
-    extract_pdf_words,
-    extract_pdf_words_parsr,
+    PARSR_SERVER,
+    PDFWord,
+    Span,
+    extract_words,
+    hash_paths,
+    iter_extract_words,
+    iter_window_words,
+    lexicon,
+    make_automaton,
     make_state,
-    match_text,
+    match_windows,
+    match_windows_automaton,
+    merge_spans,
+    merge_windows,
     merge_word_rects,
+    page_numbers,
+    punct_table,
+    select_pages,
+    stats,
+    words_cache_key,
 )
+from copymatch.batch import (
+    compare_all,
+    make_corpus,
+    transpose,
+    write_csv,
+    write_json,
+)
+from copymatch.fingerprint import NgramIndex, make_index, match_windows_index
+from copymatch.flat import FlatState, cached_state, match_windows_flat
+from copymatch.fuzzy import DeletionIndex
+from copymatch.library import Document, Library
+from copymatch.parsr_batch import ParsrBatchClient
+from copymatch.server import WorkerPool, make_server, parse_address
+from copymatch.stats import Stats
+from copymatch.suffix import (
+    SuffixAutomaton,
+    make_suffix_automaton,
+    match_windows_suffix,
+)
+from copymatch.text import is_text_source
+from copymatch.vectorized import VectorIndex, make_vector_index, match_windows_vector
 
 COLORS = [
     0x7DE198,
@@ -33,12 +79,41 @@ COLORS = [
 ]
 
 
+MATCHERS = {
+    "trie": (make_state, match_windows),
+    "hash": (make_index, match_windows_index),
+    "automaton": (make_automaton, match_windows_automaton),
+    "vector": (make_vector_index, match_windows_vector),
+    "suffix": (make_suffix_automaton, match_windows_suffix),
+}
+
+
 def convert_color(rgb: int) -> Tuple[float, float, float]:
     return (((rgb >> 16) & 255) / 255, ((rgb >> 8) & 255) / 255, (rgb & 255) / 255)
 
 
-def mk_checker(distance):
-    def checker(token, state):
+def mk_checker(distance, vocabulary: Optional[Iterable[str]] = None):
+    """Make a checker for `match_text` that accepts tokens within
+    `distance` edits of a transition.
+
+    With a `vocabulary` (all tokens of the analysis text) close tokens
+    are found with a `DeletionIndex`, preferring the closest one.
+    Without, every transition of a state is compared in turn.
+    """
+    if vocabulary is not None:
+        lookup = DeletionIndex(vocabulary, distance).lookup
+
+        def index_checker(token, state):
+            if token in state:
+                return state[token]
+            for candidate in lookup(token):
+                if candidate in state:
+                    return state[candidate]
+            return None
+
+        return index_checker
+
+    def scan_checker(token, state):
         if token in state:
             return state[token]
         else:
@@ -50,13 +125,948 @@ def mk_checker(distance):
                     return state[to_test]
         return None
 
-    return checker
+    return scan_checker
+
+
+def mk_match_checker(distance: int, index):
+    if distance == 0:
+        return None
+    # The root state has a transition for every analysis token.
+    return mk_checker(distance, vocabulary=index)
+
+
+def timed_checker(checker, path: str):
+    """Wrap `checker` to add up the time spent in it. Returns the
+    wrapper and a function reporting the total as a stage."""
+    total = [0.0, 0]
+
+    def timed(token, state):
+        start = time.perf_counter()
+        try:
+            return checker(token, state)
+        finally:
+            total[0] += time.perf_counter() - start
+            total[1] += 1
+
+    def report():
+        # Checking is all computation, so wall time is CPU time.
+        stats.emit(
+            "stage",
+            {"stage": "fuzzy_check", "wall": total[0], "cpu": total[0], "path": path},
+        )
+        stats.count("fuzzy_checks", total[1], path=path)
+
+    return timed, report
+
+
+def is_source(path: str) -> bool:
+    """Whether `path` is a PDF, or a plain text or HTML file, which
+    can only be used as source texts."""
+    return os.path.splitext(path)[-1].lower() == ".pdf" or is_text_source(path)
+
+
+def source_metadata(path: str) -> Tuple[str, str]:
+    """Title and author of the source text at `path`, left empty for
+    text files."""
+    if is_text_source(path):
+        return "", ""
+    metadata = fitz.open(path).metadata
+    return metadata["title"], metadata["author"]
+
+
+def match_source(
+    path: str,
+    index,
+    match_func,
+    extract_words_func,
+    checker,
+    pages: Optional[Tuple[int, ...]] = None,
+):
+    """Extract the words of `pages` of the source text at `path` and
+    match them against `index`. Returns the title and author of the
+    source along with the matched spans."""
+    title, author = source_metadata(path)
+    words = extract_words_func(path, pages=pages)
+    report = None
+    if checker is not None and stats.enabled():
+        checker, report = timed_checker(checker, path)
+    with stats.stage("match", path=path):
+        spans = list(merge_windows(match_func(index, words, checker=checker)))
+    if report is not None:
+        report()
+    return (title, author, spans)
+
+
+# Arguments to match_source shared by every job of a worker process,
+# set by init_worker, and whether to send back stats events.
+_worker_args: Tuple[Any, Any, Any, Any] = (None, None, None, None)
+_worker_record = False
+
+
+def init_worker(index, match_func, extract_words_func, distance: int, record: bool):
+    global _worker_args, _worker_record
+    _worker_args = (
+        index,
+        match_func,
+        extract_words_func,
+        mk_match_checker(distance, index),
+    )
+    _worker_record = record
+
+
+def match_source_in_worker(path: str, pages: Optional[Tuple[int, ...]]):
+    index, match_func, extract_words_func, checker = _worker_args
+    if not _worker_record:
+        return (
+            match_source(path, index, match_func, extract_words_func, checker, pages),
+            [],
+        )
+    with stats.recording() as events:
+        result = match_source(
+            path, index, match_func, extract_words_func, checker, pages
+        )
+    return result, events
+
+
+def match_sources(
+    paths: List[str],
+    jobs: int,
+    index,
+    match_func,
+    extract_words_func,
+    distance: int,
+    pages: Optional[List[Optional[Tuple[int, ...]]]] = None,
+):
+    """Yield the result of `match_source` for each path, in order,
+    spreading the work over `jobs` processes. `pages` are the pages of
+    each path to match, or None for all of them."""
+    if pages is None:
+        pages = [None] * len(paths)
+    if jobs <= 1:
+        checker = mk_match_checker(distance, index)
+        for path, path_pages in zip(paths, pages):
+            yield match_source(
+                path, index, match_func, extract_words_func, checker, path_pages
+            )
+        return
+    # When forking, workers inherit the index instead of unpickling a
+    # copy each.
+    if "fork" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("fork")
+    else:
+        mp_context = None
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=mp_context,
+        initializer=init_worker,
+        initargs=(index, match_func, extract_words_func, distance, stats.enabled()),
+    ) as executor:
+        for result, events in executor.map(match_source_in_worker, paths, pages):
+            stats.replay(events)
+            yield result
+
+
+def add_highlight(page: fitz.Page, rects: List[fitz.Rect], info: str, color_no: int):
+    highlight = page.add_highlight_annot(quads=rects)
+    highlight.set_colors(stroke=convert_color(COLORS[color_no]))
+    highlight.set_info(title=info)
+    highlight.update()
+
+
+def add_sticky(
+    page: fitz.Page,
+    y: float,
+    info: str,
+    color_no: int,
+    last_sticky_rect: Optional[fitz.Rect],
+) -> fitz.Rect:
+    """Add a sticky note with `info` to the left of `y`, moved down a
+    bit if it would overlap `last_sticky_rect`. Returns its rect."""
+    sticky = page.add_text_annot((10, y), info)
+    if last_sticky_rect is not None and last_sticky_rect.intersects(sticky.rect):
+        sticky.set_rect(sticky.rect.transform(fitz.Matrix(a=1.0, d=1.0, f=25)))
+    sticky.set_colors(stroke=convert_color(COLORS[color_no]))
+    sticky.update()
+    return sticky.rect
+
+
+def annotate_spans(
+    original_doc: fitz.Document,
+    words: List[PDFWord],
+    spans: Iterable[Span],
+    info: str,
+    color_no: int,
+) -> int:
+    """Highlight the words of `words`, the analysis text, covered by
+    `spans` in `original_doc`, one highlight and sticky note per page.
+    Returns the color number to use next."""
+    page_rects: Dict[int, List[fitz.Rect]] = {}
+    for start, end in merge_spans(spans):
+        for page_no, page_words in itertools.groupby(
+            words[start:end], lambda word: word.page_no
+        ):
+            page_rects.setdefault(page_no, []).extend(merge_word_rects(page_words))
+    # We don't want sticky notes to overlap, so keep track of the
+    # last sticky note height and page and move it down a bit if
+    # we'd otherwise overlap.
+    last_sticky_rect = None
+    for page_no, rects in page_rects.items():
+        page = original_doc[page_no]
+        add_highlight(page, rects, info, color_no)
+        last_sticky_rect = add_sticky(
+            page, rects[0].y0, info, color_no, last_sticky_rect
+        )
+        color_no = (color_no + 1) % len(COLORS)
+    return color_no
+
+
+def match_runs(matches: Iterable[PDFWord]) -> Iterator[List[PDFWord]]:
+    """Group matches in the order they are found into runs of words in
+    order on the same page, yielding each run once it is complete."""
+    run: List[PDFWord] = []
+    for word in matches:
+        if len(run) > 0 and (word.page_no != run[-1].page_no or word.pos < run[-1].pos):
+            yield run
+            run = []
+        run.append(word)
+    if len(run) > 0:
+        yield run
+
+
+def annotate_match_stream(
+    original_doc: fitz.Document, matches: Iterable[PDFWord], info: str, color_no: int
+) -> int:
+    """Same as `annotate_spans`, but for matched words in the order they
+    are found. Each run of matched words is highlighted as soon as it
+    is complete, and each page still gets a single sticky note."""
+    page_colors: Dict[int, int] = {}
+    last_sticky_rect = None
+    for run in match_runs(matches):
+        rects = merge_word_rects(run)
+        page_no = run[0].page_no
+        page = original_doc[page_no]
+        if page_no not in page_colors:
+            page_colors[page_no] = color_no
+            last_sticky_rect = add_sticky(
+                page, rects[0].y0, info, color_no, last_sticky_rect
+            )
+            color_no = (color_no + 1) % len(COLORS)
+        add_highlight(page, rects, info, page_colors[page_no])
+    return color_no
+
+
+def add_extraction_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "-p",
+        "--parsr",
+        action="store_true",
+        help="Use parsr server for processing PDFs.",
+    )
+    parser.add_argument(
+        "--parsr-jobs",
+        type=int,
+        default=8,
+        help="Number of documents sent to the parsr server at the same time (default is 8).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Extract the words of every text and build the trie of the analysis text, even if they are cached.",
+    )
+    parser.add_argument(
+        "--lexicon",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="Word list, one word per line, deciding which words hyphenated across lines are joined. May be given more than once, for instance for texts in several languages (default is the words of the Brown corpus).",
+    )
+
+
+def add_pages_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--pages",
+        type=page_numbers,
+        default=None,
+        metavar="RANGE",
+        help="Pages of the text to analyze, numbered from 1, like 3-5,9 (default is every page).",
+    )
+
+
+# A source text given as PATH:RANGE.
+SOURCE_PAGES = re.compile(r"(.+):([0-9][-,0-9]*)")
+
+
+def source_pages(source: str) -> Tuple[str, Optional[Tuple[int, ...]]]:
+    """Path and pages of a source text given as PATH or PATH:RANGE,
+    like thesis.pdf:40-95, with the pages numbered from 1."""
+    match = SOURCE_PAGES.fullmatch(source)
+    if match is None or os.path.exists(source):
+        return source, None
+    return match[1], page_numbers(match[2])
+
+
+def check_analysis_text(parser: argparse.ArgumentParser, path: str):
+    """Exit with a usage error unless `path` is a PDF, which matches
+    can be annotated on."""
+    if os.path.splitext(path)[-1].lower() != ".pdf":
+        parser.error(f"the analysis text must be a PDF, not {path}")
+
+
+def check_pages(
+    parser: argparse.ArgumentParser, path: str, pages: Optional[Tuple[int, ...]]
+):
+    """Exit with a usage error unless `path` is a PDF with all of
+    `pages`."""
+    if pages is None:
+        return
+    try:
+        if is_text_source(path):
+            raise ValueError(f"{path} has no pages")
+        with fitz.open(path) as doc:
+            select_pages(path, doc.page_count, pages)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+def add_stats_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--stats",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Write time spent per stage and document, counts, peak memory and cache hit rates as JSON to FILE, or to standard error for -.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Write cProfile statistics of matching to FILE. Only matching in the main process is profiled, so use with --jobs 1.",
+    )
+
+
+@contextlib.contextmanager
+def instrumented(args: argparse.Namespace):
+    """Collect stats and profile the run as asked by `args`."""
+    if args.stats is None and args.profile is None:
+        yield
+        return
+    collected = Stats()
+    with stats.hook(collected), stats.profiling(args.profile, "match", "stream"):
+        with stats.stage("total"):
+            yield
+    if args.stats is not None:
+        report = json.dumps(collected.report(), indent=2)
+        if args.stats == "-":
+            print(report, file=sys.stderr)
+        else:
+            with open(args.stats, "w") as f:
+                f.write(report + "\n")
+
+
+def analysis_index(args: argparse.Namespace, words: List[PDFWord]):
+    """Index of `words`, the analysis text, for `args.matcher`. With
+    --mmap-index and without --no-cache, the trie is saved in the cache
+    directory and memory-mapped from there by later runs."""
+    make_index_func, _ = MATCHERS[args.matcher]
+    if args.matcher != "trie" or args.no_cache or not args.mmap_index:
+        return make_index_func(words, ngram_size=args.length)
+    key = words_cache_key(
+        args.analysis_text,
+        "parsr" if args.parsr else "pymupdf",
+        tuple(args.lexicon),
+        args.pages,
+    )
+    return cached_state(words, args.length, key)
+
+
+def index_size(index) -> int:
+    """Number of states of a trie or n-grams of a hash index."""
+    if isinstance(index, NgramIndex):
+        return len(index.starts) + sum(map(len, index.more_starts.values()))
+    if isinstance(index, VectorIndex):
+        return len(index.hashes)
+    if isinstance(index, SuffixAutomaton):
+        return len(index.length)
+    if isinstance(index, FlatState):
+        return index.trie.state_count
+    count = 0
+    todo = [index]
+    while len(todo) > 0:
+        state = todo.pop()
+        count += 1
+        todo.extend(state.transitions.values())
+    return count
+
+
+def mk_extract_words_func(args: argparse.Namespace, jobs: int = 1):
+    return functools.partial(
+        extract_words,
+        extractor="parsr" if args.parsr else "pymupdf",
+        jobs=jobs,
+        cache=not args.no_cache,
+        lexicons=tuple(args.lexicon),
+    )
+
+
+def prefetch_parsr(args: argparse.Namespace, paths: List[str]):
+    """Have the parsr server process all `paths` concurrently, ahead of
+    extracting their words one by one from the cache."""
+    paths = [path for path in paths if not is_text_source(path)]
+    if not args.parsr or len(paths) < 2:
+        return
+    client = ParsrBatchClient(PARSR_SERVER, max_in_flight=args.parsr_jobs)
+    for path, error in client.process_all(paths).items():
+        if error is not None:
+            print(f"parsr failed for {path}: {error}", file=sys.stderr)
+    client.close()
+
+
+def changed_sources(
+    library: Library, paths: List[str], jobs: int = 1
+) -> List[Tuple[str, str, List[int]]]:
+    """Those of `paths` whose content is not in `library` yet, with
+    their SHA-256 and the ids of the documents indexed before under
+    the same path, which they replace.
+
+    Documents of paths whose new content is in the library under
+    another path already, or comes first under another of `paths`,
+    are removed. Each path is only looked at once.
+    """
+    paths = list(dict.fromkeys(paths))
+    retval = []
+    added = set()
+    for path, sha256 in zip(paths, hash_paths(paths, jobs=jobs)):
+        stale = [doc.id for doc in library.find_path(path) if doc.sha256 != sha256]
+        if sha256 not in added and library.find(sha256) is None:
+            retval.append((path, sha256, stale))
+            added.add(sha256)
+        elif len(stale) > 0:
+            library.remove(*stale)
+    return retval
+
+
+def index_source(
+    library: Library, extract_words_func, path: str, sha256: str, replaces: List[int]
+) -> Document:
+    title, author = source_metadata(path)
+    words = extract_words_func(path)
+    with stats.stage("index", path=path):
+        return library.add(
+            path,
+            sha256,
+            words,
+            title=title,
+            author=author,
+            replaces=replaces,
+        )
+
+
+def remove_sources(library: Library, paths: Iterable[str]) -> List[Document]:
+    removed = [doc for path in paths for doc in library.find_path(path)]
+    library.remove(*(doc.id for doc in removed))
+    return removed
+
+
+def index_main(argv: List[str]):
+    parser = argparse.ArgumentParser(
+        prog="copymatch index",
+        description="Add source texts to a library index, replacing those indexed before under the same path whose content has changed",
+    )
+    parser.add_argument("library", type=str, help="Library index file.")
+    parser.add_argument(
+        "source_texts",
+        nargs="+",
+        type=str,
+        help="Source texts: PDFs, plain text or HTML files.",
+    )
+    parser.add_argument(
+        "-l",
+        "--length",
+        type=int,
+        default=None,
+        help="Number of tokens per indexed n-gram, fixed when the library is created (default is 8)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of files hashed at the same time (default is 1).",
+    )
+    parser.add_argument(
+        "-r",
+        "--remove",
+        action="store_true",
+        help="Remove the documents indexed under the given paths instead, which need not exist anymore.",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Afterwards, rewrite the library without the space left by removed and replaced documents.",
+    )
+    add_extraction_arguments(parser)
+    add_stats_arguments(parser)
+    args = parser.parse_args(argv)
+    with instrumented(args):
+        extract_words_func = mk_extract_words_func(args)
+        paths = [path for path in args.source_texts if is_source(path)]
+        with Library(args.library, ngram_size=args.length) as library:
+            if args.remove:
+                remove_sources(library, paths)
+            else:
+                todo = changed_sources(library, paths, jobs=args.jobs)
+                prefetch_parsr(args, [path for path, _, _ in todo])
+                for path, sha256, replaces in todo:
+                    index_source(library, extract_words_func, path, sha256, replaces)
+            if args.compact:
+                with stats.stage("compact"):
+                    library.compact()
+
+
+def compact_library(path: str):
+    with Library(path) as library:
+        library.compact()
+
+
+def sync_directory(
+    args: argparse.Namespace,
+    library: Library,
+    extract_words_func,
+    known: Dict[str, Tuple[int, int, str]],
+):
+    """Bring `library` up to date with the PDFs under `args.directory`.
+
+    `known` maps each file indexed under its own path to its size,
+    modification time and SHA-256 when it was, and is updated. Files
+    with the same content as one indexed under another path are not
+    in it, so that they are indexed once that one is removed. Files
+    modified within the last `args.settle` seconds may still be being
+    written, and are left for later.
+    """
+    found = {}
+    for root, _, files in os.walk(args.directory):
+        for name in files:
+            if is_source(name):
+                path = os.path.join(root, name)
+                with contextlib.suppress(FileNotFoundError):
+                    st = os.stat(path)
+                    found[path] = (st.st_size, st.st_mtime_ns)
+    prefix = os.path.join(args.directory, "")
+    gone = {
+        doc.path
+        for doc in library.documents()
+        if doc.path.startswith(prefix) and doc.path not in found
+    }
+    removed = set()
+    for doc in remove_sources(library, sorted(gone)):
+        removed.add(doc.sha256)
+        print(f"removed {doc.path}", file=sys.stderr)
+    for path in set(known) - set(found):
+        del known[path]
+    for path in [path for path, (_, _, sha256) in known.items() if sha256 in removed]:
+        del known[path]
+    settled = time.time_ns() - int(args.settle * 1e9)
+    paths = sorted(
+        path
+        for path, key in found.items()
+        if known.get(path, ())[:2] != key and key[1] <= settled
+    )
+    todo = changed_sources(library, paths)
+    prefetch_parsr(args, [path for path, _, _ in todo])
+    for path, sha256, replaces in todo:
+        # Files that fail are only tried again once they change.
+        known[path] = (*found[path], sha256)
+        try:
+            index_source(library, extract_words_func, path, sha256, replaces)
+        except Exception as e:
+            print(f"could not index {path}: {e}", file=sys.stderr)
+        else:
+            print(f"indexed {path}", file=sys.stderr)
+    for path in paths:
+        for doc in library.find_path(path):
+            known[path] = (*found[path], doc.sha256)
+
+
+def watch_main(argv: List[str]):
+    parser = argparse.ArgumentParser(
+        prog="copymatch watch",
+        description="Keep a library index up to date with the PDFs, plain text and HTML files in a directory, adding, replacing and removing documents as files are",
+    )
+    parser.add_argument("library", type=str, help="Library index file.")
+    parser.add_argument("directory", type=str, help="Directory to watch.")
+    parser.add_argument(
+        "-l",
+        "--length",
+        type=int,
+        default=None,
+        help="Number of tokens per indexed n-gram, fixed when the library is created (default is 8)",
+    )
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=5.0,
+        help="Seconds between looks at the directory (default is 5).",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=2.0,
+        help="Seconds a file must be left unmodified before it is indexed (default is 2).",
+    )
+    parser.add_argument(
+        "--compact",
+        type=float,
+        default=None,
+        metavar="FRACTION",
+        help="Compact the library in the background whenever more than FRACTION of it is left unused by removed and replaced documents (default is never).",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Bring the library up to date once and exit.",
+    )
+    add_extraction_arguments(parser)
+    args = parser.parse_args(argv)
+    extract_words_func = mk_extract_words_func(args)
+    known: Dict[str, Tuple[int, int, str]] = {}
+    compaction: Optional[threading.Thread] = None
+    with Library(args.library, ngram_size=args.length) as library:
+        try:
+            while True:
+                # The library is left alone while it is being compacted.
+                if compaction is None or not compaction.is_alive():
+                    sync_directory(args, library, extract_words_func, known)
+                    if (
+                        args.compact is not None
+                        and library.free_fraction() > args.compact
+                    ):
+                        compaction = threading.Thread(
+                            target=compact_library, args=(args.library,)
+                        )
+                        compaction.start()
+                if args.once:
+                    break
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            pass
+        if compaction is not None:
+            compaction.join()
+
+
+def query_main(argv: List[str]):
+    parser = argparse.ArgumentParser(
+        prog="copymatch query",
+        description="Find and annotate text copied from any text in a library index",
+    )
+    parser.add_argument("library", type=str, help="Library index file.")
+    parser.add_argument("analysis_text", type=str, help="Text to analyze.")
+    add_pages_argument(parser)
+    add_extraction_arguments(parser)
+    add_stats_arguments(parser)
+    args = parser.parse_args(argv)
+    check_analysis_text(parser, args.analysis_text)
+    check_pages(parser, args.analysis_text, args.pages)
+    with instrumented(args):
+        extract_words_func = mk_extract_words_func(args)
+        original_doc = fitz.open(args.analysis_text)
+        with Library(args.library) as library:
+            words = extract_words_func(args.analysis_text, pages=args.pages)
+            with stats.stage("match"):
+                results = sorted(library.query_spans(words).items())
+            annotate_library_matches(original_doc, library, words, results)
+        with stats.stage("save"):
+            original_doc.save("output.pdf")
+
+
+def annotate_library_matches(
+    original_doc: fitz.Document,
+    library: Library,
+    words: List[PDFWord],
+    results: List[Tuple[int, List[Span]]],
+):
+    """Annotate the spans of each library document in `results`."""
+    color_no = 0
+    for doc_id, spans in results:
+        source = library.document(doc_id)
+        info = f"{source.author}, {source.title} ({os.path.basename(source.path)})"
+        with stats.stage("annotate", path=source.path):
+            color_no = annotate_spans(original_doc, words, spans, info, color_no)
+
+
+# Library and word extraction of a serve worker process, set by
+# init_serve_worker.
+_serve_library: Optional[Library] = None
+_serve_extract_words_func = None
+
+
+def init_serve_worker(
+    library_path: str, cache_size: int, extract_words_func, lexicons: Tuple[str, ...]
+):
+    global _serve_library, _serve_extract_words_func
+    _serve_library = Library(library_path, cache_size=cache_size)
+    _serve_extract_words_func = extract_words_func
+    # Load the tables used by extraction before the first request.
+    punct_table()
+    lexicon(lexicons)
+
+
+def serve_match(data: bytes, params: Dict[str, str]) -> Tuple[str, bytes]:
+    """Match the PDF `data` against the library of this worker.
+
+    Returns the spans of each document as JSON, or the PDF annotated
+    with them if the "annotate" parameter is set.
+    """
+    assert _serve_library is not None and _serve_extract_words_func is not None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "analysis.pdf")
+        with open(path, "wb") as f:
+            f.write(data)
+        pages = params.get("pages")
+        words = _serve_extract_words_func(
+            path, pages=None if pages is None else page_numbers(pages)
+        )
+        results = sorted(_serve_library.query_spans(words).items())
+        if params.get("annotate", "0") not in ("", "0"):
+            original_doc = fitz.open(path)
+            annotate_library_matches(original_doc, _serve_library, words, results)
+            return "application/pdf", original_doc.tobytes()
+    documents = []
+    for doc_id, spans in results:
+        source = _serve_library.document(doc_id)
+        documents.append(
+            {
+                "id": source.id,
+                "path": source.path,
+                "title": source.title,
+                "author": source.author,
+                "spans": [
+                    [
+                        span.source_start,
+                        span.source_end,
+                        span.analysis_start,
+                        span.analysis_end,
+                    ]
+                    for span in spans
+                ],
+            }
+        )
+    body = {"tokens": len(words), "documents": documents}
+    return "application/json", json.dumps(body).encode()
+
+
+def serve_main(argv: List[str]):
+    parser = argparse.ArgumentParser(
+        prog="copymatch serve",
+        description="Match documents sent over HTTP against a library index, keeping it and everything else loaded between requests",
+        epilog="POST a PDF to /match to get the spans copied from each library document as JSON, or to /match?annotate=1 to get it back annotated. Add pages=RANGE, like pages=3-5,9, to only match those pages. GET /status reports how busy the server is.",
+    )
+    parser.add_argument("library", type=str, help="Library index file.")
+    parser.add_argument(
+        "-a",
+        "--address",
+        type=str,
+        default="localhost:8765",
+        help="HOST:PORT, or unix:PATH for a Unix socket, to listen on (default is localhost:8765).",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of documents matched at the same time, each in its own process (default is the number of CPUs).",
+    )
+    parser.add_argument(
+        "-q",
+        "--queue",
+        type=int,
+        default=32,
+        help="Number of documents waiting to be matched beyond those being matched, after which requests are turned away with 503 (default is 32).",
+    )
+    parser.add_argument(
+        "--cache-documents",
+        type=int,
+        default=256,
+        help="Number of library documents whose tokens each process keeps in memory between requests (default is 256).",
+    )
+    add_extraction_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.parsr:
+        parser.error("--parsr is not supported by serve")
+    # Documents sent are extracted once and never again.
+    args.no_cache = True
+    if not os.path.exists(args.library):
+        parser.error(f"no library index at {args.library}")
+    try:
+        parse_address(args.address)
+    except ValueError as e:
+        parser.error(str(e))
+    pool = WorkerPool(
+        serve_match,
+        args.jobs,
+        args.queue,
+        init_serve_worker,
+        (
+            args.library,
+            args.cache_documents,
+            mk_extract_words_func(args),
+            tuple(args.lexicon),
+        ),
+    )
+    pool.warm_up()
+    server = make_server(args.address, pool)
+    print(f"serving {args.library} on {args.address}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown()
+
+
+def batch_main(argv: List[str]):
+    parser = argparse.ArgumentParser(
+        prog="copymatch batch",
+        description="Compare every text of a cohort with each other and with source texts",
+    )
+    parser.add_argument("texts", nargs="+", type=str, help="Texts to compare.")
+    parser.add_argument(
+        "-s",
+        "--sources",
+        nargs="+",
+        default=[],
+        type=str,
+        help="Source texts, compared with every text but not with each other. Besides PDFs, these can be plain text or HTML files.",
+    )
+    parser.add_argument(
+        "-l",
+        "--length",
+        type=int,
+        default=8,
+        help="Minimum number of required tokens matched to count (default is 8)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="-",
+        help="File to write the report to (default is standard output).",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["json", "csv"],
+        default=None,
+        help="Report format: every overlap with its spans as JSON, or a matrix of matched word counts as CSV (default is by the extension of --output, else JSON).",
+    )
+    parser.add_argument(
+        "-a",
+        "--annotate",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="Also write a copy of each text to DIR, annotated with the matches from every other text.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes extracting texts (default is 1).",
+    )
+    add_extraction_arguments(parser)
+    add_stats_arguments(parser)
+    args = parser.parse_args(argv)
+    with instrumented(args):
+        report_format = args.format
+        if report_format is None:
+            report_format = "csv" if args.output.lower().endswith(".csv") else "json"
+        extract_words_func = mk_extract_words_func(args)
+        texts = [
+            path for path in args.texts if os.path.splitext(path)[-1].lower() == ".pdf"
+        ]
+        sources = [path for path in args.sources if is_source(path)]
+        paths = texts + sources
+        prefetch_parsr(args, paths)
+        if args.jobs > 1:
+            with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                docs = list(executor.map(extract_words_func, paths))
+        else:
+            docs = [extract_words_func(path) for path in paths]
+        documents = []
+        for path, words in zip(paths, docs):
+            title, author = source_metadata(path)
+            documents.append(
+                {
+                    "path": path,
+                    "title": title,
+                    "author": author,
+                    "words": len(words),
+                }
+            )
+        with stats.stage("index"):
+            corpus = make_corpus(docs, ngram_size=args.length)
+        with stats.stage("match"):
+            overlaps = list(compare_all(corpus, docs, len(texts)))
+
+        def write(f):
+            if report_format == "json":
+                write_json(f, documents, overlaps, args.length)
+            else:
+                write_csv(f, documents, overlaps, len(texts))
+
+        if args.output == "-":
+            write(sys.stdout)
+        else:
+            with open(args.output, "w", newline="") as f:
+                write(f)
+        if args.annotate is not None:
+            os.makedirs(args.annotate, exist_ok=True)
+            for a, path in enumerate(texts):
+                original_doc = fitz.open(path)
+                color_no = 0
+                for overlap in overlaps:
+                    if overlap.a != a:
+                        continue
+                    other = documents[overlap.b]
+                    info = f"{other['author']}, {other['title']} ({os.path.basename(other['path'])})"
+                    spans = [transpose(span) for span in overlap.spans]
+                    with stats.stage("annotate", path=path):
+                        color_no = annotate_spans(
+                            original_doc, docs[a], spans, info, color_no
+                        )
+                with stats.stage("save", path=path):
+                    original_doc.save(
+                        os.path.join(args.annotate, os.path.basename(path))
+                    )
+
+
+COMMANDS = {
+    "index": index_main,
+    "query": query_main,
+    "batch": batch_main,
+    "serve": serve_main,
+    "watch": watch_main,
+}
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Find and annotate similar texts")
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        return COMMANDS[sys.argv[1]](sys.argv[2:])
+    parser = argparse.ArgumentParser(
+        description="Find and annotate similar texts",
+        epilog="Other commands: copymatch {index,query,batch,serve,watch} --help",
+    )
     parser.add_argument("analysis_text", type=str, help="Text to analyze.")
-    parser.add_argument("source_texts", nargs="+", type=str, help="Source texts.")
+    parser.add_argument(
+        "source_texts",
+        nargs="+",
+        type=str,
+        help="Source texts: PDFs, plain text or HTML files. PDFs can be followed by the pages to match, numbered from 1, like thesis.pdf:40-95,120.",
+    )
+    add_pages_argument(parser)
     parser.add_argument(
         "-d",
         "--distance",
@@ -71,55 +1081,113 @@ def main():
         default=8,
         help="Minimum number of required tokens matched to mark text (default is 8)",
     )
+    add_extraction_arguments(parser)
+    add_stats_arguments(parser)
     parser.add_argument(
-        "-p",
-        "--parsr",
+        "-m",
+        "--matcher",
+        choices=MATCHERS.keys(),
+        default="trie",
+        help="Index used to find matches (default is trie). The hash index uses far less memory, the automaton scans sources faster and the vector index hashes whole texts at once with NumPy, which is fastest on large texts, but all three only support exact matches. The suffix automaton finds whole copied passages of at least --length tokens at once rather than n-gram by n-gram, also only exactly.",
+    )
+    parser.add_argument(
+        "--mmap-index",
         action="store_true",
-        help="Use parsr server for processing PDFs.",
+        help="Save the trie in the cache directory and memory-map it from there in later runs, which then start at once and share one copy between processes, but scan sources more slowly.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes extracting and matching source texts, or extracting pages of a single text (default is 1).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Extract and match source texts one page at a time, annotating matches as they are found. Uses little memory for huge sources, but matches them one after another.",
     )
 
     args = parser.parse_args()
-    if args.parsr:
-        extract_words_func = extract_pdf_words_parsr
-    else:
-        extract_words_func = extract_pdf_words
-    original_doc = fitz.open(args.analysis_text)
-    words = extract_words_func(args.analysis_text)
-    state = make_state(words, ngram_size=args.length)
-    color_no = 0
-    for path in args.source_texts:
-        if os.path.splitext(path)[-1].lower() != ".pdf":
-            continue
-        doc = fitz.open(path)
-        title = doc.metadata["title"]
-        author = doc.metadata["author"]
-        if args.distance == 0:
-            checker = None
+    check_analysis_text(parser, args.analysis_text)
+    if args.distance > 0 and args.matcher != "trie":
+        parser.error("--distance requires the trie matcher")
+    with instrumented(args):
+        _, match_func = MATCHERS[args.matcher]
+        extract_words_func = mk_extract_words_func(args)
+        # A document on its own has its pages split over the processes.
+        extract_doc_words_func = mk_extract_words_func(args, jobs=args.jobs)
+        try:
+            sources = [
+                (path, pages)
+                for path, pages in map(source_pages, args.source_texts)
+                if is_source(path)
+            ]
+        except ValueError as e:
+            parser.error(str(e))
+        check_pages(parser, args.analysis_text, args.pages)
+        for path, pages in sources:
+            check_pages(parser, path, pages)
+        paths = [path for path, _ in sources]
+        source_page_nos = [pages for _, pages in sources]
+        prefetch_parsr(args, [args.analysis_text, *paths])
+        original_doc = fitz.open(args.analysis_text)
+        words = extract_doc_words_func(args.analysis_text, pages=args.pages)
+        with stats.stage("index"):
+            index = analysis_index(args, words)
+        if isinstance(index, FlatState):
+            match_func = match_windows_flat
+        if stats.enabled():
+            stats.count("index_entries", index_size(index))
+        color_no = 0
+        if args.stream:
+            iter_extract_words_func = functools.partial(
+                iter_extract_words,
+                extractor="parsr" if args.parsr else "pymupdf",
+                cache=not args.no_cache,
+                lexicons=tuple(args.lexicon),
+            )
+            checker = mk_match_checker(args.distance, index)
+            for path, pages in sources:
+                title, author = source_metadata(path)
+                info = f"{author}, {title} ({os.path.basename(path)})"
+                # Extraction, matching and annotation are interleaved.
+                with stats.stage("stream", path=path):
+                    windows = match_func(
+                        index,
+                        iter_extract_words_func(path, pages=pages),
+                        checker=checker,
+                    )
+                    matches = iter_window_words(words, windows)
+                    color_no = annotate_match_stream(
+                        original_doc, matches, info, color_no
+                    )
         else:
-            checker = mk_checker(args.distance)
-        # We don't want sticky notes to overlap, so keep track of the
-        # last sticky note height and page and move it down a bit if
-        # we'd otherwise overlap.
-        last_sticky_rect = None
-        for page_no, words in itertools.groupby(
-            match_text(state, extract_words_func(path), checker=checker),
-            lambda word: word.page_no,
-        ):
-            rects = merge_word_rects(words)
-            page = original_doc[page_no]
-            info = f"{author}, {title} ({os.path.basename(path)})"
-            highlight = page.add_highlight_annot(quads=rects)
-            highlight.set_colors(stroke=convert_color(COLORS[color_no]))
-            highlight.set_info(title=info)
-            highlight.update()
-
-            sticky = page.add_text_annot((10, rects[0].y0), info)
-            if last_sticky_rect is not None and last_sticky_rect.intersects(
-                sticky.rect
-            ):
-                sticky.set_rect(sticky.rect.transform(fitz.Matrix(a=1.0, d=1.0, f=25)))
-            sticky.set_colors(stroke=convert_color(COLORS[color_no]))
-            sticky.update()
-            last_sticky_rect = sticky.rect
-            color_no = (color_no + 1) % len(COLORS)
-    original_doc.save("output.pdf")
+            if len(paths) > 1:
+                results = match_sources(
+                    paths,
+                    args.jobs,
+                    index,
+                    match_func,
+                    extract_words_func,
+                    args.distance,
+                    source_page_nos,
+                )
+            else:
+                results = match_sources(
+                    paths,
+                    1,
+                    index,
+                    match_func,
+                    extract_doc_words_func,
+                    args.distance,
+                    source_page_nos,
+                )
+            for path, (title, author, spans) in zip(paths, results):
+                info = f"{author}, {title} ({os.path.basename(path)})"
+                with stats.stage("annotate", path=path):
+                    color_no = annotate_spans(
+                        original_doc, words, spans, info, color_no
+                    )
+        with stats.stage("save"):
+            original_doc.save("output.pdf")
@@ -0,0 +1,111 @@
+import itertools
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from copymatch import Window, Word, merge_windows, span_words
+
+# Rabin-Karp parameters: a Mersenne prime modulus keeps the arithmetic
+# exact in Python ints while making collisions vanishingly rare.
+MODULUS = (1 << 61) - 1
+BASE = 1_000_003
+
+# Number of words of a streamed text hashed at a time.
+CHUNK_SIZE = 1 << 14
+
+
+def rolling_hashes(ids: Sequence[int], ngram_size: int) -> Iterator[Tuple[int, int]]:
+    """Yield (start, hash) for every window of `ngram_size` ids.
+
+    Negative ids stand for tokens that cannot match anything, so
+    windows containing them are skipped without being hashed.
+    """
+    top = pow(BASE, ngram_size - 1, MODULUS)
+    h = 0
+    run = 0
+    for idx, id_ in enumerate(ids):
+        if id_ < 0:
+            h = 0
+            run = 0
+            continue
+        if run == ngram_size:
+            h = (h - ids[idx - ngram_size] * top) % MODULUS
+        else:
+            run += 1
+        h = (h * BASE + id_) % MODULUS
+        if run == ngram_size:
+            yield idx - ngram_size + 1, h
+
+
+@dataclass
+class NgramIndex:
+    words: Sequence[Word]
+    ngram_size: int
+    vocabulary: Dict[str, int] = field(default_factory=dict)
+    ids: array = field(default_factory=lambda: array("q"))
+    # Most n-grams occur once, so the first start of each hash is kept
+    # as a plain int and only repeats pay for a list.
+    starts: Dict[int, int] = field(default_factory=dict)
+    more_starts: Dict[int, List[int]] = field(default_factory=dict)
+
+    def intern(self, text: Sequence[Word]) -> List[int]:
+        return [self.vocabulary.get(word.token, -1) for word in text]
+
+    def lookup(self, h: int) -> List[int]:
+        if h not in self.starts:
+            return []
+        return [self.starts[h], *self.more_starts.get(h, ())]
+
+
+def make_index(lst: Sequence[Word], ngram_size=8) -> NgramIndex:
+    index = NgramIndex(words=lst, ngram_size=ngram_size)
+    vocabulary = index.vocabulary
+    for word in lst:
+        index.ids.append(vocabulary.setdefault(word.token, len(vocabulary)))
+    index_ngrams(index)
+    return index
+
+
+def index_ngrams(index: NgramIndex):
+    """Record where each n-gram of `index.ids` starts."""
+    for start, h in rolling_hashes(index.ids, index.ngram_size):
+        if h in index.starts:
+            index.more_starts.setdefault(h, []).append(start)
+        else:
+            index.starts[h] = start
+
+
+def match_windows_index(
+    index: NgramIndex, text: Iterable[Word], checker=None
+) -> Iterator[Window]:
+    """Same as `match_windows`, using a `NgramIndex` instead of a trie.
+
+    `text` is hashed in chunks, each starting with the last
+    `ngram_size - 1` words of the one before so no window is lost.
+    """
+    if checker is not None:
+        raise ValueError("Fuzzy matching requires the trie index.")
+    n = index.ngram_size
+    ids: List[int] = []
+    offset = 0
+    for chunk in itertools.batched(text, CHUNK_SIZE):
+        kept = ids[len(ids) - n + 1 :]
+        offset += len(ids) - len(kept)
+        ids = kept + index.intern(chunk)
+        for start, h in rolling_hashes(ids, n):
+            window = ids[start : start + n]
+            # Guard against hash collisions.
+            analysis_starts = [
+                analysis_start
+                for analysis_start in index.lookup(h)
+                if index.ids[analysis_start : analysis_start + n].tolist() == window
+            ]
+            if len(analysis_starts) > 0:
+                yield (offset + start, offset + start + n, analysis_starts)
+
+
+def match_text_index(index: NgramIndex, text: Sequence[Word], checker=None):
+    """Same as `match_text`, using a `NgramIndex` instead of a trie."""
+    return span_words(
+        index.words, merge_windows(match_windows_index(index, text, checker=checker))
+    )
@@ -0,0 +1,268 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Container, Iterable
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Union
+
+from copymatch import (
+    State,
+    Window,
+    Word,
+    cache_dir,
+    make_state,
+    match_windows,
+    stats,
+    write_cache_file,
+)
+
+# Byte order is part of the magic, as the arrays are read in place.
+MAGIC = b"CMTRIE1" + (b"L" if sys.byteorder == "little" else b"B")
+# Magic, n-gram size and the number of states, transitions, start
+# points, vocabulary words and vocabulary bytes. The header is followed
+# by uint32 arrays: the offset of each vocabulary word and of the end of
+# the last, then (after the UTF-8 words, padded to 4 bytes) the offset
+# of the first transition of each state and of the end of the last, the
+# token id and target state of each transition, sorted by token id
+# within each state, the depth of each state, the offset of the first
+# start point of each state and of the end of the last, and the start
+# points themselves. State 0 is the root.
+HEADER = struct.Struct("<8sIIIIII")
+
+# Number of cached indexes kept, the least recently used going first.
+INDEX_CACHE_FILES = 8
+
+
+def save_state(base: State, path: Path):
+    """Write the trie `base`, built by `make_state`, to `path` in the
+    format read by `FlatTrie`."""
+    vocabulary: dict = {}
+    states = [base]
+    trans_offsets = array("I", [0])
+    tokens = array("I")
+    targets = array("I")
+    depths = array("I")
+    start_offsets = array("I", [0])
+    starts = array("I")
+    # Breadth first, numbering states as they are reached.
+    for state in states:
+        transitions = sorted(
+            (vocabulary.setdefault(token, len(vocabulary)), child)
+            for token, child in state.transitions.items()
+        )
+        for token_id, child in transitions:
+            tokens.append(token_id)
+            targets.append(len(states))
+            states.append(child)
+        trans_offsets.append(len(tokens))
+        depths.append(state.length)
+        starts.extend(state.startpoints)
+        start_offsets.append(len(starts))
+    encoded = [token.encode() for token in vocabulary]
+    vocab_offsets = array("I", [0])
+    for token in encoded:
+        vocab_offsets.append(vocab_offsets[-1] + len(token))
+    text = b"".join(encoded)
+    # Zero if the text is too short to have any n-gram.
+    ngram_size = next((state.length for state in states if state.end_state), 0)
+    with write_cache_file(path) as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                ngram_size,
+                len(states),
+                len(tokens),
+                len(starts),
+                len(encoded),
+                len(text),
+            )
+        )
+        f.write(vocab_offsets.tobytes())
+        f.write(text + b"\0" * (-len(text) % 4))
+        for values in (trans_offsets, tokens, targets, depths, start_offsets, starts):
+            f.write(values.tobytes())
+
+
+class FlatTrie:
+    """A trie saved by `save_state`, memory-mapped read-only.
+
+    Only the vocabulary is read into memory when opening one, so it is
+    quick to open and processes opening the same file share one copy of
+    the rest. Pickles as its path, without `words`.
+    """
+
+    def __init__(self, path: Path, words: Optional[Sequence[Word]] = None):
+        self.path = path
+        self.words = words
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            self.ngram_size,
+            self.state_count,
+            transition_count,
+            start_count,
+            vocab_count,
+            vocab_bytes,
+        ) = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a saved trie")
+        view = memoryview(self.data)
+        pos = HEADER.size
+
+        def take(count: int) -> memoryview:
+            nonlocal pos
+            pos += 4 * count
+            return view[pos - 4 * count : pos].cast("I")
+
+        vocab_offsets = take(vocab_count + 1)
+        text = bytes(view[pos : pos + vocab_bytes])
+        pos += vocab_bytes + (-vocab_bytes % 4)
+        self.tokens = [
+            text[vocab_offsets[n] : vocab_offsets[n + 1]].decode()
+            for n in range(vocab_count)
+        ]
+        self.vocabulary = {token: n for n, token in enumerate(self.tokens)}
+        self.trans_offsets = take(self.state_count + 1)
+        self.trans_tokens = take(transition_count)
+        self.trans_targets = take(transition_count)
+        self.depths = take(self.state_count)
+        self.start_offsets = take(self.state_count + 1)
+        self.starts = take(start_count)
+
+    def __reduce__(self):
+        return (FlatTrie, (self.path,))
+
+    def transition(self, state: int, token: str) -> int:
+        """State reached from `state` with `token`, or -1."""
+        token_id = self.vocabulary.get(token)
+        if token_id is None:
+            return -1
+        hi = self.trans_offsets[state + 1]
+        n = bisect_left(self.trans_tokens, token_id, self.trans_offsets[state], hi)
+        if n < hi and self.trans_tokens[n] == token_id:
+            return self.trans_targets[n]
+        return -1
+
+    @property
+    def root(self) -> "FlatState":
+        return FlatState(self, 0)
+
+
+class FlatState(Container[str], Iterable[str]):
+    """A state of a `FlatTrie`, standing in for a `State` when
+    matching."""
+
+    __slots__ = ("trie", "id")
+
+    def __init__(self, trie: FlatTrie, id: int):
+        self.trie = trie
+        self.id = id
+
+    def __contains__(self, token: object) -> bool:
+        return isinstance(token, str) and self.trie.transition(self.id, token) >= 0
+
+    def __getitem__(self, token: str) -> "FlatState":
+        target = self.trie.transition(self.id, token)
+        if target < 0:
+            raise KeyError(token)
+        return FlatState(self.trie, target)
+
+    def __iter__(self) -> Iterator[str]:
+        trie = self.trie
+        for n in range(trie.trans_offsets[self.id], trie.trans_offsets[self.id + 1]):
+            yield trie.tokens[trie.trans_tokens[n]]
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def length(self) -> int:
+        return self.trie.depths[self.id]
+
+    @property
+    def end_state(self) -> bool:
+        return self.id > 0 and self.trie.depths[self.id] == self.trie.ngram_size
+
+    @property
+    def startpoints(self) -> List[int]:
+        trie = self.trie
+        return trie.starts[
+            trie.start_offsets[self.id] : trie.start_offsets[self.id + 1]
+        ].tolist()
+
+    @property
+    def words(self) -> Optional[Sequence[Word]]:
+        return self.trie.words
+
+
+def match_windows_flat(
+    base: FlatState, text: Iterable[Word], checker=None
+) -> Iterator[Window]:
+    """Same as `match_windows`, walking the arrays of a `FlatTrie`
+    directly rather than through `FlatState`s."""
+    if checker is not None:
+        yield from match_windows(base, text, checker=checker)
+        return
+    trie = base.trie
+    vocabulary = trie.vocabulary
+    offsets = trie.trans_offsets
+    tokens = trie.trans_tokens
+    targets = trie.trans_targets
+    depths = trie.depths
+    ngram_size = trie.ngram_size
+    next_states = [0]
+    for idx, word in enumerate(text):
+        token_id = vocabulary.get(word.token)
+        new_next_states = [0]
+        if token_id is not None:
+            for state in next_states:
+                hi = offsets[state + 1]
+                n = bisect_left(tokens, token_id, offsets[state], hi)
+                if n == hi or tokens[n] != token_id:
+                    continue
+                target = targets[n]
+                if depths[target] == ngram_size:
+                    yield (
+                        idx - ngram_size + 1,
+                        idx + 1,
+                        FlatState(trie, target).startpoints,
+                    )
+                else:
+                    new_next_states.append(target)
+        next_states = new_next_states
+
+
+def load_state(path: Path, words: Optional[Sequence[Word]] = None) -> FlatState:
+    """Root of the trie saved at `path`, with `words` standing for the
+    analysis text it was built from."""
+    return FlatTrie(path, words).root
+
+
+def cached_state(
+    words: Sequence[Word], ngram_size: int, key: str
+) -> Union[State, FlatState]:
+    """Same trie as `make_state(words, ngram_size)`, saved in the cache
+    directory under `key`, naming the words, and memory-mapped from
+    there once it is. A trie just built is returned as is, since
+    matching with it is faster."""
+    digest = hashlib.sha256(f"{MAGIC!r}:{key}:{ngram_size}".encode()).hexdigest()
+    directory = cache_dir() / "indexes"
+    directory.mkdir(exist_ok=True)
+    path = directory / f"{digest[:32]}.trie"
+    if path.exists():
+        stats.count("index_cache_hits")
+        # Mark as recently used.
+        os.utime(path)
+        return load_state(path, words)
+    stats.count("index_cache_misses")
+    base = make_state(words, ngram_size=ngram_size)
+    save_state(base, path)
+    cached = sorted(directory.glob("*.trie"), key=lambda p: p.stat().st_mtime)
+    for old in cached[:-INDEX_CACHE_FILES]:
+        old.unlink(missing_ok=True)
+    return base
@@ -0,0 +1,50 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+import Levenshtein
+
+
+def deletes(word: str, distance: int) -> Set[str]:
+    """All strings made by deleting up to `distance` characters of `word`."""
+    retval = {word}
+    level = {word}
+    for _ in range(distance):
+        level = {w[:i] + w[i + 1 :] for w in level for i in range(len(w))}
+        retval |= level
+    return retval
+
+
+class DeletionIndex:
+    """SymSpell-style index for finding words within an edit distance.
+
+    Two words are within Levenshtein distance `distance` only if
+    deleting at most `distance` characters from each gives the same
+    string, so a lookup only has to compare `token` against the
+    vocabulary words that share one of its deletions instead of
+    against the whole vocabulary.
+    """
+
+    def __init__(self, vocabulary: Iterable[str], distance: int):
+        self.distance = distance
+        self.deletes: Dict[str, List[str]] = {}
+        for word in set(vocabulary):
+            for variant in deletes(word, distance):
+                self.deletes.setdefault(variant, []).append(word)
+        # Tokens repeat a lot in natural language text.
+        self.cache: Dict[str, Tuple[str, ...]] = {}
+
+    def lookup(self, token: str) -> Tuple[str, ...]:
+        """Vocabulary words within the edit distance of `token`, closest
+        first."""
+        if token in self.cache:
+            return self.cache[token]
+        candidates: Set[str] = set()
+        for variant in deletes(token, self.distance):
+            candidates.update(self.deletes.get(variant, ()))
+        hits = []
+        for candidate in candidates:
+            d = Levenshtein.distance(token, candidate, score_cutoff=self.distance)
+            if d <= self.distance:
+                hits.append((d, candidate))
+        retval = tuple(candidate for _, candidate in sorted(hits))
+        self.cache[token] = retval
+        return retval
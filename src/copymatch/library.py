@@ -0,0 +1,281 @@
+import hashlib
+import sqlite3
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from copymatch import (
+    Span,
+    Word,
+    cache_decode,
+    cache_encode,
+    merge_windows,
+    span_words,
+)
+from copymatch.fingerprint import MODULUS, rolling_hashes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL UNIQUE,
+    title TEXT,
+    author TEXT
+);
+CREATE TABLE IF NOT EXISTS words (
+    doc_id INTEGER PRIMARY KEY REFERENCES documents (id),
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    hash INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL,
+    pos INTEGER NOT NULL,
+    PRIMARY KEY (hash, doc_id, pos)
+) WITHOUT ROWID;
+"""
+
+
+def token_id(token: str) -> int:
+    """Id of a token that is stable across runs and documents."""
+    digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % MODULUS
+
+
+def fingerprints(words: Sequence[Word], ngram_size: int):
+    return rolling_hashes([token_id(word.token) for word in words], ngram_size)
+
+
+@dataclass(eq=True, frozen=True)
+class Document:
+    id: int
+    path: str
+    sha256: str
+    title: Optional[str]
+    author: Optional[str]
+
+
+class Library:
+    """Persistent n-gram fingerprint index of a library of source texts.
+
+    Every n-gram of every source is stored with its document id and
+    start position, and the extracted words (including their rects)
+    are kept alongside, so a query never has to open a source PDF.
+
+    Documents can be added, replaced and removed one at a time. The
+    database is in WAL mode, so it can be queried from other processes
+    while it is being changed or compacted.
+
+    The tokens of the last `cache_size` documents matched are kept in
+    memory, for long-lived libraries queried many times, until the
+    library is changed.
+    """
+
+    def __init__(
+        self, path: str, ngram_size: Optional[int] = None, cache_size: int = 0
+    ):
+        self.cache_size = cache_size
+        self.token_cache: Dict[int, List[str]] = {}
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+        self.data_version = self.get_data_version()
+        row = self.db.execute(
+            "SELECT value FROM meta WHERE key = 'ngram_size'"
+        ).fetchone()
+        if row is None:
+            self.ngram_size = 8 if ngram_size is None else ngram_size
+            with self.db:
+                self.db.execute(
+                    "INSERT INTO meta VALUES ('ngram_size', ?)", (str(self.ngram_size),)
+                )
+        else:
+            self.ngram_size = int(row[0])
+            if ngram_size is not None and ngram_size != self.ngram_size:
+                raise ValueError(
+                    f"{path} is indexed with n-grams of length {self.ngram_size}"
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM documents").fetchone()[0]
+
+    def find(self, sha256: str) -> Optional[Document]:
+        row = self.db.execute(
+            "SELECT * FROM documents WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        return None if row is None else Document(*row)
+
+    def find_path(self, path: str) -> List[Document]:
+        return [
+            Document(*row)
+            for row in self.db.execute(
+                "SELECT * FROM documents WHERE path = ? ORDER BY id", (path,)
+            )
+        ]
+
+    def documents(self) -> List[Document]:
+        return [
+            Document(*row)
+            for row in self.db.execute("SELECT * FROM documents ORDER BY id")
+        ]
+
+    def document(self, doc_id: int) -> Document:
+        return Document(
+            *self.db.execute(
+                "SELECT * FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+        )
+
+    def words(self, doc_id: int) -> List[Word]:
+        (data,) = self.db.execute(
+            "SELECT data FROM words WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        return cache_decode(data)
+
+    def tokens(self, doc_id: int) -> List[str]:
+        tokens = self.token_cache.pop(doc_id, None)
+        if tokens is None:
+            tokens = [word.token for word in self.words(doc_id)]
+        if self.cache_size > 0:
+            # Dicts keep insertion order, so the first is the least
+            # recently used.
+            self.token_cache[doc_id] = tokens
+            if len(self.token_cache) > self.cache_size:
+                del self.token_cache[next(iter(self.token_cache))]
+        return tokens
+
+    def add(
+        self,
+        path: str,
+        sha256: str,
+        words: Sequence[Word],
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        replaces: Iterable[int] = (),
+    ) -> Document:
+        """Add a document, removing the documents with ids in
+        `replaces` in the same transaction."""
+        with self.db:
+            self.delete(replaces)
+            doc_id = self.db.execute(
+                "INSERT INTO documents (path, sha256, title, author) VALUES (?, ?, ?, ?)",
+                (path, sha256, title, author),
+            ).lastrowid
+            assert doc_id is not None
+            self.db.execute(
+                "INSERT INTO words VALUES (?, ?)", (doc_id, cache_encode(words))
+            )
+            self.db.executemany(
+                "INSERT OR IGNORE INTO fingerprints VALUES (?, ?, ?)",
+                (
+                    (h, doc_id, start)
+                    for start, h in fingerprints(words, self.ngram_size)
+                ),
+            )
+        return Document(doc_id, path, sha256, title, author)
+
+    def remove(self, *doc_ids: int):
+        with self.db:
+            self.delete(doc_ids)
+
+    def delete(self, doc_ids: Iterable[int]):
+        """Same as `remove`, in the transaction already open."""
+        for doc_id in doc_ids:
+            # Fingerprints are keyed by hash, so the hashes of the
+            # document are needed to find them quickly.
+            self.db.executemany(
+                "DELETE FROM fingerprints WHERE hash = ? AND doc_id = ? AND pos = ?",
+                (
+                    (h, doc_id, start)
+                    for start, h in fingerprints(self.words(doc_id), self.ngram_size)
+                ),
+            )
+            self.db.execute("DELETE FROM words WHERE doc_id = ?", (doc_id,))
+            self.db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            self.token_cache.pop(doc_id, None)
+
+    def free_fraction(self) -> float:
+        """Fraction of the database file left unused by removals."""
+        (free,) = self.db.execute("PRAGMA freelist_count").fetchone()
+        (total,) = self.db.execute("PRAGMA page_count").fetchone()
+        return free / total if total > 0 else 0.0
+
+    def compact(self):
+        """Rewrite the database without the space left by removals."""
+        self.db.execute("VACUUM")
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def get_data_version(self) -> int:
+        return self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def query_spans(self, words: Sequence[Word]) -> Dict[int, List[Span]]:
+        """Match `words` against every document in the library.
+
+        Returns the spans of each document, as the source text, found
+        in `words`, as the analysis text, keyed by the id of the
+        document.
+        """
+        n = self.ngram_size
+        # Ids of removed documents are reused, so cached tokens are only
+        # good as long as nothing else changed the library.
+        data_version = self.get_data_version()
+        if data_version != self.data_version:
+            self.token_cache.clear()
+            self.data_version = data_version
+        starts: Dict[int, List[int]] = defaultdict(list)
+        for start, h in fingerprints(words, n):
+            starts[h].append(start)
+        self.db.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS query (hash INTEGER PRIMARY KEY)"
+        )
+        # Committed, so that no transaction is left open to hold back
+        # changes by other connections.
+        with self.db:
+            self.db.execute("DELETE FROM temp.query")
+            self.db.executemany(
+                "INSERT INTO temp.query VALUES (?)", ((h,) for h in starts)
+            )
+        hits: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        for h, doc_id, pos in self.db.execute(
+            "SELECT f.hash, f.doc_id, f.pos FROM temp.query AS q"
+            " JOIN fingerprints AS f ON f.hash = q.hash"
+        ):
+            hits[doc_id].append((pos, h))
+        retval = {}
+        analysis = [word.token for word in words]
+        for doc_id, doc_hits in hits.items():
+            source = self.tokens(doc_id)
+            windows = []
+            for pos, h in sorted(doc_hits):
+                tokens = source[pos : pos + n]
+                # Guard against hash collisions.
+                analysis_starts = [
+                    start
+                    for start in starts[h]
+                    if analysis[start : start + n] == tokens
+                ]
+                if len(analysis_starts) > 0:
+                    windows.append((pos, pos + n, analysis_starts))
+            if len(windows) > 0:
+                retval[doc_id] = list(merge_windows(windows))
+        return retval
+
+    def query(self, words: Sequence[Word]) -> Dict[int, List[Word]]:
+        """Match `words` against every document in the library.
+
+        Returns the matched words of `words`, as `match_text` would,
+        keyed by the id of each document they were found in.
+        """
+        return {
+            doc_id: span_words(words, spans)
+            for doc_id, spans in self.query_spans(words).items()
+        }
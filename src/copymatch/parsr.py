@@ -101,15 +101,12 @@ class ParsrClient:
                 raise Exception("No server address provided")
             else:
                 server = self.server
-                packet = {
-                    "file": (file_path, open(file_path, "rb"), "application/pdf"),
-                    "config": (
-                        config_path,
-                        open(config_path, "rb"),
-                        "application/json",
-                    ),
-                }
-                r = post("http://" + server + "/api/v1/document", files=packet)
+                with open(file_path, "rb") as file, open(config_path, "rb") as config:
+                    packet = {
+                        "file": (file_path, file, "application/pdf"),
+                        "config": (config_path, config, "application/json"),
+                    }
+                    r = post("http://" + server + "/api/v1/document", files=packet)
                 jobId = r.text
         if not document_name:
             document_name = path.splitext(path.basename(file_path))[0]
@@ -250,11 +247,12 @@ class ParsrClient:
                 files = [glob(e) for e in self.__supported_input_files()]
                 files_flat = list(chain.from_iterable(files))
         for file in files_flat:
-            packet = {
-                "file": (file, open(file, "rb"), "application/pdf"),
-                "config": (config, open(config, "rb"), "application/json"),
-            }
-            r = post("http://" + server + "/api/v1/document", files=packet)
+            with open(file, "rb") as f, open(config, "rb") as c:
+                packet = {
+                    "file": (file, f, "application/pdf"),
+                    "config": (config, c, "application/json"),
+                }
+                r = post("http://" + server + "/api/v1/document", files=packet)
             responses.append(
                 {
                     "file": file,
@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from copymatch import cache_file, hash_path, parsr_cache, parsr_word_table
+from copymatch.cache import ParsrCache
+
+
+class ParsrBatchClient:
+    """Sends many documents to a Parsr server at once.
+
+    At most `max_in_flight` documents are being uploaded, processed or
+    downloaded at any time, all over one pool of connections. Jobs
+    are polled starting every `poll_min` seconds, backing off by
+    `backoff` after each unfinished poll up to every `poll_max`
+    seconds. Finished results go straight into the Parsr cache.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        config_path: str = "defaultConfig.json",
+        max_in_flight: int = 8,
+        poll_min: float = 0.5,
+        poll_max: float = 30.0,
+        backoff: float = 1.5,
+        cache: Optional[ParsrCache] = None,
+    ):
+        self.server = server
+        self.config_path = config_path
+        self.max_in_flight = max_in_flight
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.backoff = backoff
+        self.cache = parsr_cache(cache_file()) if cache is None else cache
+        with open(config_path, "rb") as f:
+            self.config = f.read()
+        self.session = Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+
+    def url(self, endpoint: str) -> str:
+        return f"http://{self.server}/api/v1/{endpoint}"
+
+    def submit(self, file_path: str) -> str:
+        with open(file_path, "rb") as f:
+            files: Dict[str, Tuple[str, Union[BinaryIO, bytes], str]] = {
+                "file": (path.basename(file_path), f, "application/pdf"),
+                "config": (
+                    path.basename(self.config_path),
+                    self.config,
+                    "application/json",
+                ),
+            }
+            r = self.session.post(self.url("document"), files=files)
+        r.raise_for_status()
+        return r.text
+
+    def wait(self, job_id: str):
+        delay = self.poll_min
+        while True:
+            r = self.session.get(self.url(f"queue/{job_id}"))
+            r.raise_for_status()
+            if "progress-percentage" not in r.json():
+                return
+            time.sleep(delay)
+            delay = min(delay * self.backoff, self.poll_max)
+
+    def process(self, file_path: str):
+        sum = hash_path(file_path)
+        if self.cache.get(sum) is not None:
+            return
+        job_id = self.submit(file_path)
+        self.wait(job_id)
+        r = self.session.get(self.url(f"json/{job_id}"))
+        r.raise_for_status()
+        self.cache.put(sum, parsr_word_table(r.json()))
+
+    def process_all(self, file_paths: List[str]) -> Dict[str, Optional[Exception]]:
+        """Make sure the Parsr results of all `file_paths` are cached.
+
+        Returns, for each path, None if its result is cached or the
+        exception that prevented it.
+        """
+
+        def process(file_path: str) -> Optional[Exception]:
+            try:
+                self.process(file_path)
+            except Exception as e:
+                return e
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            return dict(zip(file_paths, executor.map(process, file_paths)))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,187 @@
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import BaseServer, ThreadingMixIn, UnixStreamServer
+from typing import Any, Callable, Dict, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+# Runs in a worker process with the body of a request and its query
+# parameters, returning the content type and body of the response.
+MatchFunc = Callable[[bytes, Dict[str, str]], Tuple[str, bytes]]
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class MatchHandler(BaseHTTPRequestHandler):
+    """POST /match runs the match function of the server on the
+    request body in a worker process. GET /status reports how busy the
+    server is."""
+
+    server: Any
+
+    def send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, obj):
+        self.send(status, "application/json", json.dumps(obj).encode())
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/status":
+            return self.send_json(404, {"error": "not found"})
+        self.send_json(200, self.server.pool.status())
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/match":
+            return self.send_json(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length", 0))
+        if length == 0:
+            return self.send_json(400, {"error": "no document"})
+        body = self.rfile.read(length)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        start = time.perf_counter()
+        try:
+            content_type, response = self.server.pool.run(body, params)
+        except QueueFull:
+            return self.send_json(503, {"error": "too many requests queued"})
+        except BrokenProcessPool:
+            # The document may not be to blame, so it is not reported
+            # as one that cannot be matched.
+            return self.send_json(500, {"error": "worker process failed"})
+        except Exception as e:
+            return self.send_json(422, {"error": f"{type(e).__name__}: {e}"})
+        self.send(200, content_type, response)
+        print(
+            f"matched {length} bytes in {time.perf_counter() - start:.3f}s",
+            file=sys.stderr,
+        )
+
+    def address_string(self) -> str:
+        # Unix sockets have no client address.
+        return str(self.client_address[0]) if self.client_address else "-"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WorkerPool:
+    """Runs `match` in `jobs` worker processes, each set up once by
+    `initializer`, with at most `queue_size` requests waiting for one
+    beyond those running."""
+
+    def __init__(
+        self,
+        match: MatchFunc,
+        jobs: int,
+        queue_size: int,
+        initializer: Callable,
+        initargs: Tuple,
+    ):
+        self.match = match
+        self.jobs = jobs
+        self.queue_size = queue_size
+        self.initializer = initializer
+        self.initargs = initargs
+        self.executor = self.make_executor()
+        self.slots = threading.BoundedSemaphore(jobs + queue_size)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.done = 0
+
+    def make_executor(self) -> ProcessPoolExecutor:
+        # Workers may be started from request threads, which forking
+        # does not go well with.
+        return ProcessPoolExecutor(
+            max_workers=self.jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer,
+            initargs=self.initargs,
+        )
+
+    def run(self, body: bytes, params: Dict[str, str]) -> Tuple[str, bytes]:
+        if not self.slots.acquire(blocking=False):
+            raise QueueFull()
+        with self.lock:
+            self.pending += 1
+            executor = self.executor
+        try:
+            return executor.submit(self.match, body, params).result()
+        except BrokenProcessPool:
+            self.replace_executor(executor)
+            raise
+        finally:
+            with self.lock:
+                self.pending -= 1
+                self.done += 1
+            self.slots.release()
+
+    def replace_executor(self, broken: ProcessPoolExecutor):
+        """Start new worker processes in place of those of `broken`,
+        one of which died, unless that was already done."""
+        with self.lock:
+            if self.executor is not broken:
+                return
+            self.executor = self.make_executor()
+        broken.shutdown(wait=False)
+
+    def status(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "jobs": self.jobs,
+                "running": min(self.pending, self.jobs),
+                "queued": max(self.pending - self.jobs, 0),
+                "done": self.done,
+            }
+
+    def warm_up(self):
+        """Start every worker process now rather than on the first
+        requests."""
+        for future in [self.executor.submit(os.getpid) for _ in range(self.jobs)]:
+            future.result()
+
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """Path of the Unix socket given as unix:PATH, or host and port of
+    the TCP socket given as HOST:PORT."""
+    if address.startswith("unix:"):
+        if address == "unix:":
+            raise ValueError("no path in unix: address")
+        return address[len("unix:") :]
+    host, sep, port = address.rpartition(":")
+    if sep == "" or not port.isdigit():
+        raise ValueError(f"{address} is neither HOST:PORT nor unix:PATH")
+    return host, int(port)
+
+
+def make_server(address: str, pool: WorkerPool) -> BaseServer:
+    """An HTTP server for `pool`, listening on `address`, as taken by
+    `parse_address`. A Unix socket is replaced if it exists."""
+    server: BaseServer
+    parsed = parse_address(address)
+    if isinstance(parsed, tuple):
+        server = ThreadingHTTPServer(parsed, MatchHandler)
+    else:
+        if os.path.exists(parsed):
+            os.unlink(parsed)
+        server = UnixHTTPServer(parsed, MatchHandler)
+    server.pool = pool  # type: ignore[union-attr]
+    return server
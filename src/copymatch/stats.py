@@ -0,0 +1,187 @@
+import cProfile
+import resource
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+# Called with the kind of event, "stage" or "count", and its data.
+Hook = Callable[[str, Dict[str, Any]], None]
+Event = Tuple[str, Dict[str, Any]]
+
+hooks: List[Hook] = []
+profiler: Optional[cProfile.Profile] = None
+profiled_stages: Set[str] = set()
+
+
+def enabled() -> bool:
+    """Whether anything is listening, so that costly numbers are only
+    worked out when they are wanted."""
+    return len(hooks) > 0
+
+
+def emit(event: str, data: Dict[str, Any]):
+    for hook in hooks:
+        hook(event, data)
+
+
+@contextmanager
+def hook(func: Hook) -> Iterator[Hook]:
+    """Call `func` with every event until the end of the block."""
+    hooks.append(func)
+    try:
+        yield func
+    finally:
+        hooks.remove(func)
+
+
+@contextmanager
+def stage(name: str, **info):
+    """Time the block as stage `name`. `info` is passed on to hooks,
+    with "path" naming the document the stage worked on."""
+    profile = profiler if name in profiled_stages else None
+    if not enabled() and profile is None:
+        yield
+        return
+    if profile is not None:
+        profile.enable()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        if profile is not None:
+            profile.disable()
+        emit("stage", {"stage": name, "wall": wall, "cpu": cpu, **info})
+
+
+def count(name: str, value: int = 1, **info):
+    if enabled():
+        emit("count", {"counter": name, "value": value, **info})
+
+
+@contextmanager
+def recording() -> Iterator[List[Event]]:
+    """Collect the events of the block, to be replayed by another
+    process."""
+    events: List[Event] = []
+    with hook(lambda event, data: events.append((event, data))):
+        yield events
+
+
+def replay(events: List[Event]):
+    for event, data in events:
+        emit(event, data)
+
+
+@contextmanager
+def profiling(path: Optional[str], *stages: str):
+    """Profile the given stages with cProfile, dumping the result to
+    `path`. Does nothing when `path` is None."""
+    global profiler
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiled_stages.update(stages)
+    try:
+        yield
+    finally:
+        profiler.dump_stats(path)
+        profiler = None
+        profiled_stages.clear()
+
+
+def hit_rate(hits: int, misses: int) -> Dict[str, Any]:
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 3) if total > 0 else None,
+    }
+
+
+def max_rss_mib(who: int) -> float:
+    rss = resource.getrusage(who).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return round(rss / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+class Stats:
+    """A hook adding up the events of a run into a report."""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"wall": 0.0, "cpu": 0.0, "count": 0}
+        )
+        self.documents: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(
+            lambda: defaultdict(lambda: {"wall": 0.0, "cpu": 0.0})
+        )
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.document_counters: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+
+    def __call__(self, event: str, data: Dict[str, Any]):
+        path = data.get("path")
+        if event == "stage":
+            total = self.stages[data["stage"]]
+            total["wall"] += data["wall"]
+            total["cpu"] += data["cpu"]
+            total["count"] += 1
+            if path is not None:
+                document = self.documents[path][data["stage"]]
+                document["wall"] += data["wall"]
+                document["cpu"] += data["cpu"]
+        elif event == "count":
+            self.counters[data["counter"]] += data["value"]
+            if path is not None:
+                self.document_counters[path][data["counter"]] += data["value"]
+
+    def report(self) -> Dict[str, Any]:
+        from copymatch import cache_file, parsr_cache, process_parsr_cache
+
+        caches = {
+            name: hit_rate(
+                self.counters.get(f"{name}_cache_hits", 0),
+                self.counters.get(f"{name}_cache_misses", 0),
+            )
+            for name in ("words", "hashes", "index", "normalize")
+        }
+        # Only look at the Parsr cache if this run opened it.
+        if process_parsr_cache.cache_info().currsize > 0:
+            parsr = parsr_cache(cache_file()).stats()
+            caches["parsr"] = {
+                **hit_rate(parsr["hits"], parsr["misses"]),
+                "evictions": parsr["evictions"],
+            }
+        paths = sorted(set(self.documents) | set(self.document_counters))
+        return {
+            "stages": {
+                name: {
+                    "wall": round(total["wall"], 4),
+                    "cpu": round(total["cpu"], 4),
+                    "count": total["count"],
+                }
+                for name, total in self.stages.items()
+            },
+            "documents": {
+                path: {
+                    "stages": {
+                        name: {key: round(value, 4) for key, value in total.items()}
+                        for name, total in self.documents[path].items()
+                    },
+                    **self.document_counters[path],
+                }
+                for path in paths
+            },
+            "counters": dict(self.counters),
+            "caches": caches,
+            "peak_rss_mib": {
+                "self": max_rss_mib(resource.RUSAGE_SELF),
+                "children": max_rss_mib(resource.RUSAGE_CHILDREN),
+            },
+        }
@@ -0,0 +1,217 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from copymatch import Window, Word, merge_windows, span_words
+
+
+@dataclass
+class SuffixAutomaton:
+    """Suffix automaton of the tokens of an analysis text: the smallest
+    automaton accepting every run of words of the text, with about two
+    states per word.
+
+    States are numbered from 0, the start state, and described by the
+    lists below. A state stands for runs of words that all end at the
+    same positions of the text.
+    """
+
+    words: Sequence[Word]
+    # Shortest match reported.
+    ngram_size: int
+    # Length of the longest run of each state.
+    length: List[int] = field(default_factory=lambda: [0])
+    # State of the longest suffix ending elsewhere too; -1 for state 0.
+    link: List[int] = field(default_factory=lambda: [-1])
+    transitions: List[Dict[str, int]] = field(default_factory=lambda: [{}])
+    # Position of the last word of the first occurrence.
+    first_end: List[int] = field(default_factory=lambda: [-1])
+    # Whether the state was split off another, so that it does not
+    # stand for a position of its own.
+    cloned: List[bool] = field(default_factory=lambda: [False])
+    # States sorted by the state they link to, where those linking to
+    # each state start in that order, and the number of positions each
+    # state stands for, made when first needed.
+    children: Optional[List[int]] = field(default=None, repr=False)
+    children_start: Optional[List[int]] = field(default=None, repr=False)
+    counts: Optional[List[int]] = field(default=None, repr=False)
+
+    def add_state(self, length: int, link: int, transitions, first_end, cloned):
+        self.length.append(length)
+        self.link.append(link)
+        self.transitions.append(transitions)
+        self.first_end.append(first_end)
+        self.cloned.append(cloned)
+        return len(self.length) - 1
+
+    def link_tree(self) -> Tuple[List[int], List[int]]:
+        """`children` and `children_start`, made if need be."""
+        if self.children is None or self.children_start is None:
+            links = np.array(self.link[1:], dtype=np.int64)
+            order = np.argsort(links, kind="stable")
+            self.children = (order + 1).tolist()
+            self.children_start = np.searchsorted(
+                links[order], np.arange(len(self.link) + 1)
+            ).tolist()
+        return self.children, self.children_start
+
+    def end_counts(self) -> List[int]:
+        """`counts`, made if need be."""
+        if self.counts is None:
+            counts = [0 if cloned else 1 for cloned in self.cloned]
+            counts[0] = 0
+            # Longer runs first, so each state is done before its link.
+            order = np.argsort(np.array(self.length), kind="stable")[::-1]
+            for state in order[:-1].tolist():
+                counts[self.link[state]] += counts[state]
+            self.counts = counts
+        return self.counts
+
+    def end_positions(self, state: int) -> List[int]:
+        """Where the runs of `state` end in the text, in order."""
+        children, children_start = self.link_tree()
+        retval = []
+        todo = [state]
+        while len(todo) > 0:
+            state = todo.pop()
+            if not self.cloned[state]:
+                retval.append(self.first_end[state])
+            todo.extend(children[children_start[state] : children_start[state + 1]])
+        return sorted(retval)
+
+
+def make_suffix_automaton(lst: Sequence[Word], ngram_size=8) -> SuffixAutomaton:
+    """Build the suffix automaton of `lst`, in time linear in its
+    length."""
+    automaton = SuffixAutomaton(words=lst, ngram_size=ngram_size)
+    length = automaton.length
+    link = automaton.link
+    transitions = automaton.transitions
+    last = 0
+    for pos, word in enumerate(lst):
+        token = word.token
+        current = automaton.add_state(length[last] + 1, 0, {}, pos, False)
+        state = last
+        while state != -1 and token not in transitions[state]:
+            transitions[state][token] = current
+            state = link[state]
+        if state != -1:
+            next_state = transitions[state][token]
+            if length[state] + 1 == length[next_state]:
+                link[current] = next_state
+            else:
+                clone = automaton.add_state(
+                    length[state] + 1,
+                    link[next_state],
+                    dict(transitions[next_state]),
+                    automaton.first_end[next_state],
+                    True,
+                )
+                while state != -1 and transitions[state].get(token) == next_state:
+                    transitions[state][token] = clone
+                    state = link[state]
+                link[next_state] = clone
+                link[current] = clone
+        last = current
+    return automaton
+
+
+def match_windows_suffix(
+    automaton: SuffixAutomaton, text: Iterable[Word], checker=None
+) -> Iterator[Window]:
+    """Yield a `Window` for every run of at least `ngram_size` words
+    of `text` found in the analysis text, in the order of `text`, with
+    everywhere the run occurs such that it cannot be made any longer
+    there.
+
+    Each run is as long as it can be, so long copied passages come out
+    as one window rather than one per n-gram, but the windows cover the
+    same words as those of `match_windows`. Takes time linear in the
+    length of `text`, plus the number of places an n-gram of `text`
+    occurs where the run through it ends.
+    """
+    if checker is not None:
+        raise ValueError("Fuzzy matching requires the trie index.")
+    length = automaton.length
+    link = automaton.link
+    transitions = automaton.transitions
+    counts = automaton.end_counts()
+    n = automaton.ngram_size
+    state = 0
+    matched = 0
+    # State of the last n words, if they are in the analysis text.
+    ngram = -1
+    idx = 0
+    for idx, word in enumerate(text):
+        token = word.token
+        grown = None
+        if ngram >= 0:
+            # Runs through the last n-gram end here unless all of them
+            # go on with `token`.
+            grown = transitions[ngram].get(token)
+            if counts[ngram] > (0 if grown is None else counts[grown]):
+                yield from ended_windows(automaton, state, matched, ngram, idx, token)
+        next_state = transitions[state].get(token)
+        if next_state is None:
+            # Fall back to the longest suffix that can grow.
+            while next_state is None and state > 0:
+                state = link[state]
+                next_state = transitions[state].get(token)
+            if next_state is None:
+                state = 0
+                matched = 0
+                ngram = -1
+                continue
+            matched = length[state]
+        state = next_state
+        matched += 1
+        if matched < n:
+            ngram = -1
+        elif matched == n:
+            ngram = state
+        else:
+            assert grown is not None
+            ngram = link[grown] if length[link[grown]] >= n else grown
+    if ngram >= 0:
+        yield from ended_windows(automaton, state, matched, ngram, idx + 1, None)
+
+
+def ended_windows(
+    automaton: SuffixAutomaton,
+    state: int,
+    matched: int,
+    ngram: int,
+    end: int,
+    token: Optional[str],
+) -> Iterator[Window]:
+    """Windows of the runs of `text` ending at `end`, before `token`,
+    found in the analysis text where they do not go on with `token`.
+    The runs are at most `matched` words long and go through the
+    n-gram of `ngram`. Longer runs come first."""
+    words = automaton.words
+    # Where the longest run, `matched` words long, ends.
+    ref = automaton.first_end[state]
+    starts: Dict[int, List[int]] = {}
+    for pos in automaton.end_positions(ngram):
+        if pos + 1 < len(words) and words[pos + 1].token == token:
+            continue
+        size = automaton.ngram_size
+        while (
+            size < matched
+            and size <= pos
+            and words[pos - size].token == words[ref - size].token
+        ):
+            size += 1
+        starts.setdefault(size, []).append(pos - size + 1)
+    for size in sorted(starts, reverse=True):
+        yield (end - size, end, starts[size])
+
+
+def match_text_suffix(automaton: SuffixAutomaton, text: Sequence[Word], checker=None):
+    """Same as `match_text`, using a `SuffixAutomaton` instead of a
+    trie."""
+    return span_words(
+        automaton.words,
+        merge_windows(match_windows_suffix(automaton, text, checker=checker)),
+    )
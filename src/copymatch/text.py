@@ -0,0 +1,139 @@
+import os
+import sys
+from html.parser import HTMLParser
+from typing import Iterable, Iterator, List
+
+from copymatch import Word, normalize, normalize_text
+
+TEXT_EXTENSIONS = {".txt", ".text", ".md"}
+HTML_EXTENSIONS = {".html", ".htm", ".xhtml"}
+
+# Characters read from a file at a time.
+CHUNK_SIZE = 1 << 20
+
+# Elements whose text is not part of the document.
+SKIPPED_TAGS = {"script", "style", "template", "noscript", "title"}
+# Elements that can be part of a word; every other tag separates words.
+INLINE_TAGS = {
+    "a",
+    "abbr",
+    "b",
+    "bdi",
+    "bdo",
+    "cite",
+    "code",
+    "data",
+    "dfn",
+    "em",
+    "font",
+    "i",
+    "kbd",
+    "mark",
+    "q",
+    "s",
+    "samp",
+    "small",
+    "span",
+    "strong",
+    "sub",
+    "sup",
+    "time",
+    "u",
+    "var",
+    "wbr",
+}
+
+
+def is_text_source(path: str) -> bool:
+    extension = os.path.splitext(path)[-1].lower()
+    return extension in TEXT_EXTENSIONS or extension in HTML_EXTENSIONS
+
+
+def text_words(chunks: Iterable[str]) -> Iterator[Word]:
+    """Yield the words of the text made of `chunks`, split on
+    whitespace like pymupdf splits the words of a PDF, with tokens
+    normalized by `normalize` and those left empty dropped.
+
+    Only a word cut off at the end of a chunk is held back. The words
+    of a chunk are normalized in one go, joined by newlines, which
+    `normalize_text` keeps and never makes, and then interned as
+    `normalize` would.
+    """
+    pos = 0
+    rest = ""
+    for chunk in chunks:
+        pieces = (rest + chunk).split()
+        rest = ""
+        if len(pieces) > 0 and not chunk[-1:].isspace():
+            rest = pieces.pop()
+        tokens = map(sys.intern, normalize_text("\n".join(pieces)).split("\n"))
+        for piece, token in zip(pieces, tokens):
+            if token != "":
+                yield Word(token=token, pos=pos, ended_in_hyphen=(piece[-1] == "-"))
+            pos += 1
+    if rest != "":
+        token = normalize(rest)
+        if token != "":
+            yield Word(token=token, pos=pos, ended_in_hyphen=(rest[-1] == "-"))
+
+
+class HTMLText(HTMLParser):
+    """Text of an HTML document, collected as it is fed."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks: List[str] = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag not in INLINE_TAGS:
+            self.chunks.append(" ")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag not in INLINE_TAGS:
+            self.chunks.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(self.skipping - 1, 0)
+        elif tag not in INLINE_TAGS:
+            self.chunks.append(" ")
+
+    def handle_data(self, data):
+        if self.skipping == 0:
+            self.chunks.append(data)
+
+    def pop_text(self) -> str:
+        text = "".join(self.chunks)
+        self.chunks = []
+        return text
+
+
+def iter_text_chunks(path: str) -> Iterator[str]:
+    """Yield the text of the plain text or HTML file at `path` a chunk
+    at a time, decoded as UTF-8."""
+    html = os.path.splitext(path)[-1].lower() in HTML_EXTENSIONS
+    parser = HTMLText() if html else None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            if parser is None:
+                yield chunk
+            else:
+                parser.feed(chunk)
+                yield parser.pop_text()
+    if parser is not None:
+        parser.close()
+        yield parser.pop_text()
+
+
+def iter_text_file_words(path: str) -> Iterator[Word]:
+    """Same words as `extract_text_words`, yielded as the file is
+    read."""
+    return text_words(iter_text_chunks(path))
+
+
+def extract_text_words(path: str) -> List[Word]:
+    """Extract the words of the plain text or HTML file at `path`."""
+    return list(iter_text_file_words(path))
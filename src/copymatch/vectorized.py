@@ -0,0 +1,130 @@
+import itertools
+from dataclasses import dataclass, field
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from copymatch import Window, Word, merge_windows, span_words
+
+# Hashes are polynomials in BASE of the ids of an n-gram, wrapping
+# around at 2**64 like uint64 arithmetic does.
+BASE = np.uint64(1_000_003)
+
+TOKEN = attrgetter("token")
+
+# Number of words of a streamed text hashed at a time; larger than for
+# `match_windows_index` to spread the cost of each NumPy call.
+CHUNK_SIZE = 1 << 16
+
+
+def ngram_hashes(ids: np.ndarray, ngram_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Starts and hashes of every window of `ngram_size` ids, computed
+    for all windows at once.
+
+    Negative ids stand for tokens that cannot match anything, so
+    windows containing them are left out.
+    """
+    count = len(ids) - ngram_size + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+    values = ids.astype(np.uint64)
+    hashes = np.zeros(count, dtype=np.uint64)
+    for k in range(ngram_size):
+        hashes = hashes * BASE + values[k : k + count]
+    unknown = np.concatenate(([0], np.cumsum(ids < 0)))
+    starts = np.flatnonzero(unknown[ngram_size:] == unknown[:count])
+    return starts, hashes[starts]
+
+
+@dataclass
+class VectorIndex:
+    words: Sequence[Word]
+    ngram_size: int
+    vocabulary: Dict[str, int] = field(default_factory=dict)
+    ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    # Hash of every n-gram, sorted, and where each starts.
+    hashes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint64))
+    starts: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+
+    def intern(self, text: Sequence[Word]) -> np.ndarray:
+        # map over builtins keeps the per-word work out of the interpreter.
+        return np.fromiter(
+            map(self.vocabulary.get, map(TOKEN, text), itertools.repeat(-1)),
+            dtype=np.int64,
+            count=len(text),
+        )
+
+
+def make_vector_index(lst: Sequence[Word], ngram_size=8) -> VectorIndex:
+    """Same as `make_index`, with the ids and n-grams of `lst` kept in
+    NumPy arrays. Only interning the tokens is done word by word."""
+    tokens = list(map(TOKEN, lst))
+    # Numbered in order of first occurrence, like `make_index` does.
+    vocabulary = {token: n for n, token in enumerate(dict.fromkeys(tokens))}
+    index = VectorIndex(words=lst, ngram_size=ngram_size, vocabulary=vocabulary)
+    index.ids = np.fromiter(
+        map(vocabulary.__getitem__, tokens), dtype=np.int64, count=len(tokens)
+    )
+    starts, hashes = ngram_hashes(index.ids, ngram_size)
+    # Stable, so the starts of each hash stay in order.
+    order = np.argsort(hashes, kind="stable")
+    index.hashes = hashes[order]
+    index.starts = starts[order]
+    return index
+
+
+def find_ngrams(index: VectorIndex, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Every pair of a start in `ids` and a start in the analysis text
+    of the same n-gram, in order of the former and then the latter."""
+    n = index.ngram_size
+    starts, hashes = ngram_hashes(ids, n)
+    first = np.searchsorted(index.hashes, hashes, side="left")
+    counts = np.searchsorted(index.hashes, hashes, side="right") - first
+    found = counts > 0
+    starts, first, counts = starts[found], first[found], counts[found]
+    # Expand each range of equal hashes into one pair per analysis start.
+    source_starts = np.repeat(starts, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    analysis_starts = index.starts[np.repeat(first, counts) + offsets]
+    # Guard against hash collisions.
+    same = np.ones(len(source_starts), dtype=bool)
+    for k in range(n):
+        same &= index.ids[analysis_starts + k] == ids[source_starts + k]
+    return source_starts[same], analysis_starts[same]
+
+
+def match_windows_vector(
+    index: VectorIndex, text: Iterable[Word], checker=None
+) -> Iterator[Window]:
+    """Same as `match_windows`, using a `VectorIndex` instead of a trie.
+
+    `text` is interned and hashed in chunks, each starting with the
+    last `ngram_size - 1` words of the one before so no window is
+    lost.
+    """
+    if checker is not None:
+        raise ValueError("Fuzzy matching requires the trie index.")
+    n = index.ngram_size
+    ids = np.empty(0, dtype=np.int64)
+    offset = 0
+    for chunk in itertools.batched(text, CHUNK_SIZE):
+        kept = ids[len(ids) - n + 1 :]
+        offset += len(ids) - len(kept)
+        ids = np.concatenate((kept, index.intern(chunk)))
+        source_starts, analysis_starts = find_ngrams(index, ids)
+        if len(source_starts) == 0:
+            continue
+        starts, firsts = np.unique(source_starts, return_index=True)
+        analysis_starts = analysis_starts.tolist()
+        ends = [*firsts[1:].tolist(), len(analysis_starts)]
+        for start, first, end in zip(starts.tolist(), firsts.tolist(), ends):
+            yield (offset + start, offset + start + n, analysis_starts[first:end])
+
+
+def match_text_vector(index: VectorIndex, text: Sequence[Word], checker=None):
+    """Same as `match_text`, using a `VectorIndex` instead of a trie."""
+    return span_words(
+        index.words,
+        merge_windows(match_windows_vector(index, text, checker=checker)),
+    )
@@ -0,0 +1,83 @@
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator
+
+# Magic and number of words, followed by the little-endian uint32
+# offset of each word and of the end of the last, then the UTF-8 words
+# themselves in byte order.
+MAGIC = b"CMLEX001"
+HEADER = struct.Struct("<8sI")
+OFFSET = struct.Struct("<I")
+
+
+def is_compiled(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def compile_lexicon(words: Iterable[str], path: Path):
+    """Write `words` to `path` in the format read by `Lexicon`."""
+    # Imported here, as copymatch imports this module.
+    from copymatch import write_cache_file
+
+    encoded = sorted({word.encode() for word in words if word != ""})
+    offsets = array("I", [0])
+    for word in encoded:
+        offsets.append(offsets[-1] + len(word))
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    with write_cache_file(path) as f:
+        f.write(HEADER.pack(MAGIC, len(encoded)))
+        f.write(offsets.tobytes())
+        f.write(b"".join(encoded))
+
+
+class Lexicon:
+    """Words of the compiled lexicons at `paths`, looked up by binary
+    search in memory-mapped files.
+
+    Opening one costs next to nothing however many words it holds,
+    and processes reading the same file share its pages.
+    """
+
+    def __init__(self, *paths: Path):
+        self.maps = []
+        for path in paths:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, count = HEADER.unpack_from(data)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a compiled lexicon")
+            self.maps.append((data, count, HEADER.size + (count + 1) * OFFSET.size))
+
+    @staticmethod
+    def word_at(data: mmap.mmap, text_start: int, n: int) -> bytes:
+        start, end = struct.unpack_from("<II", data, HEADER.size + n * OFFSET.size)
+        return data[text_start + start : text_start + end]
+
+    def __contains__(self, word: object) -> bool:
+        if not isinstance(word, str):
+            return False
+        key = word.encode()
+        for data, count, text_start in self.maps:
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.word_at(data, text_start, mid) < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo < count and self.word_at(data, text_start, lo) == key:
+                return True
+        return False
+
+    def __iter__(self) -> Iterator[str]:
+        for data, count, text_start in self.maps:
+            for n in range(count):
+                yield self.word_at(data, text_start, n).decode()
+
+    def __len__(self) -> int:
+        return sum(count for _, count, _ in self.maps)
@@ -0,0 +1,87 @@
+import fitz
+import pytest
+
+ANALYSIS = """the quick brown fox jumps over the lazy dog while a stitch in time
+saves nine and the early bird catches the worm"""
+SOURCES = [
+    "yesterday the quick brown fox jumps over the lazy dog again",
+    "they say a stitch in time saves nine and the early bird wins",
+    "nothing in common at all",
+]
+
+
+@pytest.fixture(autouse=True, scope="session")
+def cache_home(tmp_path_factory):
+    """Keep the files cached by tests that do not use a cache directory
+    of their own out of the real one."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+        yield
+
+
+@pytest.fixture
+def analysis_text():
+    """An analysis text with a passage of each of `source_texts` but
+    the last."""
+    return ANALYSIS
+
+
+@pytest.fixture
+def source_texts():
+    return list(SOURCES)
+
+
+def write_pdf(path, text):
+    doc = fitz.open()
+    doc.new_page().insert_textbox(fitz.Rect(40, 40, 560, 800), text)
+    doc.set_metadata({"title": path.stem, "author": "Anon"})
+    doc.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def make_pdf():
+    """Function writing a one page PDF of a text to a path, titled
+    after the file name, and returning the path as a string."""
+    return write_pdf
+
+
+def parsr_json(words):
+    def mk_word(order, content):
+        return {
+            "type": "word",
+            "content": content,
+            "box": {"l": 10.0 * order, "t": 5.0, "w": 9.0, "h": 4.0},
+            "properties": {"order": order},
+        }
+
+    return {
+        "pages": [
+            {
+                "pageNumber": 1,
+                "elements": [
+                    {
+                        "type": "paragraph",
+                        "properties": {"order": 0},
+                        "content": [
+                            {
+                                "type": "line",
+                                "properties": {"order": 0},
+                                "content": [
+                                    mk_word(order, content)
+                                    for order, content in enumerate(words)
+                                ],
+                            }
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+@pytest.fixture
+def mk_parsr_json():
+    """Function making the JSON Parsr returns for a document of one
+    line of `words`."""
+    return parsr_json
@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+
+from copymatch import make_state, match_text, span_words, tokenize
+from copymatch.batch import (
+    compare_all,
+    make_corpus,
+    match_corpus,
+    write_csv,
+    write_json,
+)
+
+
+def test_match_corpus(analysis_text, source_texts):
+    docs = [tokenize(text) for text in [analysis_text, *source_texts]]
+    corpus = make_corpus(docs, 4)
+    # Only the last 3 words of one text and the first of the next.
+    assert match_corpus(corpus, tokenize("the worm yesterday the")) == {}
+    for source in docs[1:]:
+        spans = match_corpus(corpus, source).get(0, [])
+        assert span_words(docs[0], spans) == match_text(make_state(docs[0], 4), source)
+
+
+def test_compare_all(analysis_text, source_texts):
+    docs = [
+        tokenize(text) for text in [analysis_text, analysis_text[:80], *source_texts]
+    ]
+    overlaps = list(compare_all(make_corpus(docs, 4), docs, 2))
+    assert [(o.a, o.b, o.a_tokens, o.b_tokens) for o in overlaps] == [
+        (0, 1, 16, 16),
+        (0, 2, 9, 9),
+        (0, 3, 10, 10),
+        (1, 0, 16, 16),
+        (1, 2, 9, 9),
+        (1, 3, 6, 6),
+    ]
+    documents = [{"path": f"{n}.pdf", "words": len(doc)} for n, doc in enumerate(docs)]
+    f = io.StringIO()
+    write_csv(f, documents, overlaps, 2)
+    rows = list(csv.reader(io.StringIO(f.getvalue())))
+    assert rows[0] == ["document", "words", "0.pdf", "1.pdf", "2.pdf", "3.pdf", "4.pdf"]
+    assert rows[1:] == [
+        ["0.pdf", "23", "", "16", "9", "10", "0"],
+        ["1.pdf", "17", "16", "", "9", "6", "0"],
+    ]
+    f = io.StringIO()
+    write_json(f, documents, overlaps, 4)
+    report = json.loads(f.getvalue())
+    assert report["overlaps"][0]["spans"] == [[0, 16, 0, 16]]
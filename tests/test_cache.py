@@ -0,0 +1,72 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlitedict import SqliteDict
+
+from copymatch import (
+    cache_decode,
+    cache_encode,
+    cache_file,
+    extract_pdf_words_parsr,
+    hash_path,
+    parsr_cache,
+)
+from copymatch.cache import ParsrCache, decode_word_table, encode_word_table
+
+ROWS = [
+    ("Hello", 1.0, 2.5, 30.0, 10.0, 0, 0, 0, 0),
+    ("wörld—", 32.0, 2.5, 30.0, 10.0, 1, 0, 0, 0),
+    ("", 0.0, 0.0, 0.0, 0.0, 2, 1, 3, 2),
+]
+
+
+def test_word_table_encoding():
+    assert decode_word_table(encode_word_table(ROWS)) == ROWS
+    assert decode_word_table(encode_word_table([])) == []
+
+
+def test_parsr_cache_eviction(tmp_path):
+    cache = ParsrCache(
+        tmp_path / "cache.db", max_bytes=2 * len(encode_word_table(ROWS))
+    )
+    cache.put("a", ROWS)
+    cache.put("b", ROWS)
+    assert cache.get("a") == ROWS
+    cache.put("c", ROWS)
+    assert cache.get("b") is None
+    assert cache.get("a") == ROWS
+    assert cache.get("c") == ROWS
+    assert cache.stats() == {"hits": 3, "misses": 1, "evictions": 1}
+
+
+def test_parsr_legacy_cache(tmp_path, monkeypatch, mk_parsr_json):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"not really a pdf")
+    sum = hash_path(str(path))
+    with SqliteDict(
+        cache_file(), encode=cache_encode, decode=cache_decode, autocommit=True
+    ) as db:
+        db[sum] = mk_parsr_json(["Hello,", "world"])
+    words = extract_pdf_words_parsr(str(path))
+    assert [word.token for word in words] == ["hello", "world"]
+    assert words[1].rects[0].x0 == 10.0
+    with SqliteDict(cache_file()) as db:
+        assert sum not in db
+    assert extract_pdf_words_parsr(str(path)) == words
+    assert parsr_cache(cache_file()).stats()["hits"] == 1
+
+
+def open_parsr_cache_in_child(parent_id: int):
+    cache = parsr_cache(cache_file())
+    cache.put("child", ROWS)
+    return id(cache) != parent_id and cache.get("child") == ROWS
+
+
+def test_parsr_cache_after_fork(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    parent = parsr_cache(cache_file())
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("fork")) as pool:
+        assert pool.submit(open_parsr_cache_in_child, id(parent)).result()
+    assert parsr_cache(cache_file()) is parent
+    assert parent.get("child") == ROWS
@@ -0,0 +1,229 @@
+import argparse
+import os
+import shutil
+import sys
+
+import fitz
+import pytest
+
+import copymatch
+from copymatch import (
+    extract_pdf_words,
+    extract_words,
+    iter_pdf_words,
+    iter_window_words,
+    make_state,
+    match_text,
+    match_windows,
+    span_words,
+)
+from copymatch.copymatch import (
+    annotate_match_stream,
+    index_main,
+    main,
+    match_runs,
+    match_sources,
+    query_main,
+    sync_directory,
+)
+from copymatch.library import Library
+
+
+def test_extract_pdf_words_parallel(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    doc = fitz.open()
+    for n in range(9):
+        # Hyphenated across every page break.
+        page = doc.new_page()
+        page.insert_text((40, 60), "thing")
+        page.insert_text((40, 80), f"page {n} says some-")
+    doc.save(tmp_path / "pages.pdf")
+    path = str(tmp_path / "pages.pdf")
+    words = extract_pdf_words(path)
+    assert [word.token for word in words[:6]] == [
+        "thing",
+        "page",
+        "0",
+        "says",
+        "something",
+        "page",
+    ]
+    assert words[4].page_no == 0
+    assert extract_pdf_words(path, jobs=2) == words
+    assert list(iter_pdf_words(path)) == words
+    # Only the pages asked for, still numbered as in the document, and
+    # not joined across the pages left out.
+    pages = extract_pdf_words(path, jobs=2, pages=(2, 3, 5))
+    assert [word.token for word in pages[:6]] == [
+        "thing",
+        "page",
+        "2",
+        "says",
+        "something",
+        "page",
+    ]
+    assert pages[-1].token == "some"
+    assert {word.page_no for word in pages} == {2, 3, 5}
+    assert pages == extract_pdf_words(path, pages=(2, 3, 5))
+    assert list(iter_pdf_words(path, pages=(2, 3, 5))) == pages
+
+
+def test_match_sources_parallel(
+    tmp_path, monkeypatch, analysis_text, source_texts, make_pdf
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    analysis = extract_pdf_words(make_pdf(tmp_path / "analysis.pdf", analysis_text))
+    paths = [
+        make_pdf(tmp_path / f"source{n}.pdf", text)
+        for n, text in enumerate(source_texts)
+    ]
+    base = make_state(analysis, 4)
+    serial = list(match_sources(paths, 1, base, match_windows, extract_pdf_words, 0))
+    assert serial[0][:2] == ("source0", "Anon")
+    assert [len(span_words(analysis, spans)) for _, _, spans in serial] == [9, 10, 0]
+    parallel = list(match_sources(paths, 2, base, match_windows, extract_pdf_words, 0))
+    assert parallel == serial
+
+
+def test_extract_words_cache(tmp_path, monkeypatch, analysis_text, make_pdf):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = make_pdf(tmp_path / "analysis.pdf", analysis_text)
+    calls = []
+
+    def extract_pdf_words_counted(path, **kwargs):
+        calls.append(path)
+        return extract_pdf_words(path, **kwargs)
+
+    monkeypatch.setattr(copymatch, "extract_pdf_words", extract_pdf_words_counted)
+    words = extract_words(path)
+    assert extract_words(path) == words
+    assert extract_words(path, cache=False) == words
+    assert len(calls) == 2
+    monkeypatch.setattr(copymatch, "extraction_version", lambda *args: "new")
+    assert extract_words(path) == words
+    assert len(calls) == 3
+
+
+def test_annotate_match_stream(
+    tmp_path, monkeypatch, analysis_text, source_texts, make_pdf
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = make_pdf(tmp_path / "analysis.pdf", analysis_text)
+    analysis = extract_pdf_words(path)
+    base = make_state(analysis, 4)
+    # The second passage comes first, so the matches are out of order.
+    source = extract_pdf_words(
+        make_pdf(tmp_path / "source.pdf", " ".join(reversed(source_texts)))
+    )
+    matches = list(iter_window_words(analysis, match_windows(base, iter(source))))
+    assert sorted(matches, key=lambda word: word.pos) == match_text(base, source)
+    runs = list(match_runs(matches))
+    assert [[word.token for word in run] for run in runs] == [
+        "a stitch in time saves nine and the early bird".split(),
+        "the quick brown fox jumps over the lazy dog".split(),
+    ]
+    original_doc = fitz.open(path)
+    assert annotate_match_stream(original_doc, iter(matches), "info", 0) == 1
+    assert [annot.type[1] for annot in original_doc[0].annots()] == [
+        "Text",
+        "Highlight",
+        "Highlight",
+    ]
+
+
+def test_sync_directory(tmp_path, monkeypatch, source_texts, make_pdf):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    directory = tmp_path / "sources"
+    directory.mkdir()
+    for n, text in enumerate(source_texts):
+        make_pdf(directory / f"source{n}.pdf", text)
+    args = argparse.Namespace(directory=str(directory), settle=0, parsr=False)
+    known = {}
+    with Library(str(tmp_path / "library.db"), ngram_size=4) as library:
+
+        def paths():
+            return {os.path.basename(doc.path) for doc in library.documents()}
+
+        sync_directory(args, library, extract_words, known)
+        assert paths() == {"source0.pdf", "source1.pdf", "source2.pdf"}
+        (old,) = library.find_path(str(directory / "source1.pdf"))
+        make_pdf(directory / "source1.pdf", source_texts[0] + " and more")
+        os.unlink(directory / "source2.pdf")
+        make_pdf(directory / "source3.pdf", source_texts[2])
+        sync_directory(args, library, extract_words, known)
+        assert paths() == {"source0.pdf", "source1.pdf", "source3.pdf"}
+        (new,) = library.find_path(str(directory / "source1.pdf"))
+        assert new.sha256 != old.sha256
+        # Nothing changed since.
+        sync_directory(args, library, extract_words, known)
+        assert len(library) == 3
+        # Files still being written are left for later.
+        args.settle = 60
+        make_pdf(directory / "source4.pdf", "new")
+        sync_directory(args, library, extract_words, known)
+        assert "source4.pdf" not in paths()
+
+
+def test_sync_directory_duplicates(tmp_path, monkeypatch, source_texts, make_pdf):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    directory = tmp_path / "sources"
+    directory.mkdir()
+    a = make_pdf(directory / "a.pdf", source_texts[0])
+    b = str(directory / "b.pdf")
+    shutil.copy(a, b)
+    args = argparse.Namespace(directory=str(directory), settle=0, parsr=False)
+    known = {}
+    with Library(str(tmp_path / "library.db"), ngram_size=4) as library:
+        sync_directory(args, library, extract_words, known)
+        assert [doc.path for doc in library.documents()] == [a]
+        # The copy takes over once the file indexed is gone.
+        os.unlink(a)
+        sync_directory(args, library, extract_words, known)
+        assert [doc.path for doc in library.documents()] == [b]
+
+
+def test_index_duplicates(tmp_path, monkeypatch, source_texts, make_pdf):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    a = make_pdf(tmp_path / "a.pdf", source_texts[0])
+    b = str(tmp_path / "b.pdf")
+    shutil.copy(a, b)
+    library_path = str(tmp_path / "library.db")
+    # The same content under two paths, and the same path twice.
+    index_main([library_path, a, b, a])
+    with Library(library_path) as library:
+        assert [doc.path for doc in library.documents()] == [a]
+
+
+def test_pages_out_of_range(
+    tmp_path, monkeypatch, capsys, analysis_text, source_texts, make_pdf
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    analysis = make_pdf(tmp_path / "analysis.pdf", analysis_text)
+    source = make_pdf(tmp_path / "source.pdf", source_texts[0])
+    for argv in [
+        [analysis, source, "--pages", "2"],
+        [analysis, f"{source}:1-3"],
+    ]:
+        monkeypatch.setattr(sys, "argv", ["copymatch", *argv])
+        with pytest.raises(SystemExit):
+            main()
+        assert "has only 1 pages" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        query_main([str(tmp_path / "library.db"), analysis, "--pages", "2-4"])
+    assert "has only 1 pages" in capsys.readouterr().err
+    assert not os.path.exists(tmp_path / "output.pdf")
+
+
+def test_analysis_text_not_pdf(tmp_path, monkeypatch, capsys, make_pdf):
+    monkeypatch.chdir(tmp_path)
+    analysis = tmp_path / "analysis.txt"
+    analysis.write_text("the quick brown fox")
+    source = make_pdf(tmp_path / "source.pdf", "the quick brown fox")
+    monkeypatch.setattr(sys, "argv", ["copymatch", str(analysis), source])
+    with pytest.raises(SystemExit):
+        main()
+    assert "must be a PDF" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        query_main([str(tmp_path / "library.db"), str(analysis)])
+    assert "must be a PDF" in capsys.readouterr().err
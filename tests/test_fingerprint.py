@@ -0,0 +1,50 @@
+from copymatch import (
+    fingerprint,
+    make_state,
+    match_text,
+    merge_windows,
+    span_words,
+    tokenize,
+)
+from copymatch.fingerprint import (
+    make_index,
+    match_text_index,
+    match_windows_index,
+    rolling_hashes,
+)
+
+
+def test_rolling_hashes():
+    hashes = list(rolling_hashes([1, 2, 3, 1, 2, -1, 1, 2], 2))
+    assert [start for start, _ in hashes] == [0, 1, 2, 3, 6]
+    assert hashes[0][1] == hashes[3][1] == hashes[4][1]
+    assert hashes[0][1] != hashes[1][1]
+
+
+def test_match_index():
+    index = make_index(tokenize("hello world and goodbye"), 2)
+    results = match_text_index(index, tokenize("this is the world and goodbye"))
+    assert [result.pos for result in results] == [1, 2, 3]
+
+
+def test_match_index_same_as_trie():
+    analysis = tokenize(
+        """the cat sat on the mat and the cat sat on the hat while the
+        dog sat on the mat"""
+    )
+    source = tokenize("a cat sat on the mat but the dog sat on the hat")
+    for n in (1, 2, 3, 4):
+        assert match_text_index(make_index(analysis, n), source) == match_text(
+            make_state(analysis, n), source
+        )
+
+
+def test_iter_match_index_chunks(monkeypatch):
+    analysis = tokenize("one two three four five six seven eight")
+    source = tokenize("zero one two three four five six seven eight nine")
+    expected = match_text_index(make_index(analysis, 3), source)
+    assert len(expected) == 8
+    for chunk_size in (1, 2, 4):
+        monkeypatch.setattr(fingerprint, "CHUNK_SIZE", chunk_size)
+        windows = match_windows_index(make_index(analysis, 3), iter(source))
+        assert span_words(analysis, merge_windows(windows)) == expected
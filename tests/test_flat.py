@@ -0,0 +1,66 @@
+import pickle
+
+from copymatch import State, make_state, match_windows, merge_windows, stats, tokenize
+from copymatch.copymatch import mk_checker
+from copymatch.flat import (
+    INDEX_CACHE_FILES,
+    FlatState,
+    cached_state,
+    load_state,
+    match_windows_flat,
+    save_state,
+)
+from copymatch.stats import Stats
+
+ANALYSIS = """the cat sat on the mat and the cat sat on the hat while the
+dog sat on the mat and the the cat cat"""
+SOURCE = """a cat sat on the mat and then the dog sat on the hat while the
+dgo sat on the mat and the cat cat"""
+
+
+def test_flat_state(tmp_path):
+    analysis = tokenize(ANALYSIS)
+    source = tokenize(SOURCE)
+    base = make_state(analysis, 3)
+    save_state(base, tmp_path / "analysis.trie")
+    flat = load_state(tmp_path / "analysis.trie", analysis)
+    assert flat.words is analysis
+    assert sorted(flat) == sorted(base)
+    expected = list(merge_windows(match_windows(base, source)))
+    assert len(expected) > 0
+    assert list(merge_windows(match_windows(flat, source))) == expected
+    assert list(merge_windows(match_windows_flat(flat, source))) == expected
+    unpickled = pickle.loads(pickle.dumps(flat))
+    assert list(merge_windows(match_windows_flat(unpickled, source))) == expected
+    checker = mk_checker(1, vocabulary=base)
+    assert list(
+        merge_windows(match_windows_flat(flat, source, checker=mk_checker(1, flat)))
+    ) == list(merge_windows(match_windows(base, source, checker=checker)))
+
+
+def test_flat_state_short(tmp_path):
+    analysis = tokenize("too short")
+    save_state(make_state(analysis, 3), tmp_path / "short.trie")
+    flat = load_state(tmp_path / "short.trie", analysis)
+    assert list(match_windows_flat(flat, tokenize("too short too short"))) == []
+
+
+def test_cached_state(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    analysis = tokenize(ANALYSIS)
+    collected = Stats()
+    with stats.hook(collected):
+        first = cached_state(analysis, 3, "analysis")
+        second = cached_state(analysis, 3, "analysis")
+    # Built in memory the first time, memory-mapped the second.
+    assert isinstance(first, State)
+    assert isinstance(second, FlatState)
+    assert second.words is analysis
+    source = tokenize(SOURCE)
+    assert list(match_windows_flat(second, source)) == list(
+        match_windows(first, source)
+    )
+    assert collected.report()["caches"]["index"]["hits"] == 1
+    for n in range(INDEX_CACHE_FILES + 2):
+        cached_state(analysis, 3, f"other{n}")
+    assert len(list((tmp_path / "indexes").glob("*.trie"))) == INDEX_CACHE_FILES
@@ -0,0 +1,35 @@
+import random
+
+import Levenshtein
+
+from copymatch import make_state, match_text, tokenize
+from copymatch.copymatch import mk_checker
+from copymatch.fuzzy import DeletionIndex, deletes
+
+
+def test_deletes():
+    assert deletes("abc", 1) == {"abc", "bc", "ac", "ab"}
+    assert deletes("ab", 2) == {"ab", "a", "b", ""}
+
+
+def test_deletion_index_same_as_scan():
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choices("abcd", k=rng.randint(1, 6))) for _ in range(300)]
+    for distance in (1, 2):
+        index = DeletionIndex(vocabulary, distance)
+        for _ in range(100):
+            token = "".join(rng.choices("abcde", k=rng.randint(1, 7)))
+            assert set(index.lookup(token)) == {
+                word
+                for word in vocabulary
+                if Levenshtein.distance(token, word) <= distance
+            }
+
+
+def test_fuzzy_match():
+    analysis = tokenize("the quick brown fox jumps over the lazy dog")
+    base = make_state(analysis, 4)
+    source = tokenize("a quikc brown fax jumps ovr the lazy dog")
+    results = match_text(base, source, checker=mk_checker(2, vocabulary=base))
+    assert results == match_text(base, source, checker=mk_checker(2))
+    assert [result.pos for result in results] == [1, 2, 3, 4, 5, 6, 7, 8]
@@ -0,0 +1,70 @@
+import pytest
+
+from copymatch import make_state, match_text, tokenize
+from copymatch.library import Library
+
+SOURCES = [
+    "the quick brown fox jumps over the lazy dog",
+    "a stitch in time saves nine and the early bird catches the worm",
+    "nothing in common with anything at all here",
+]
+
+
+def test_library_query(tmp_path):
+    analysis = tokenize(
+        "today the quick brown fox jumps over a dog but the early bird catches the worm"
+    )
+    with Library(str(tmp_path / "library.db"), ngram_size=3) as library:
+        for n, source in enumerate(SOURCES):
+            library.add(f"{n}.pdf", str(n), tokenize(source), title=str(n))
+    with Library(str(tmp_path / "library.db")) as library:
+        assert len(library) == 3
+        assert library.find("1").path == "1.pdf"
+        results = library.query(analysis)
+        assert set(results.keys()) == {1, 2}
+        for doc_id, matches in results.items():
+            source = tokenize(SOURCES[doc_id - 1])
+            assert library.words(doc_id) == source
+            assert matches == match_text(make_state(analysis, 3), source)
+
+
+def test_library_ngram_size(tmp_path):
+    Library(str(tmp_path / "library.db"), ngram_size=3).close()
+    with pytest.raises(ValueError):
+        Library(str(tmp_path / "library.db"), ngram_size=4)
+
+
+def test_library_remove(tmp_path):
+    path = str(tmp_path / "library.db")
+    analysis = tokenize(SOURCES[0] + " " + SOURCES[1])
+    with Library(path, ngram_size=3, cache_size=8) as library:
+        for n, source in enumerate(SOURCES):
+            library.add(f"{n}.pdf", str(n), tokenize(source) * 50)
+        assert set(library.query(analysis).keys()) == {1, 2}
+        library.remove(1)
+        assert [doc.id for doc in library.documents()] == [2, 3]
+        assert set(library.query(analysis).keys()) == {2}
+        (count,) = library.db.execute(
+            "SELECT count(*) FROM fingerprints WHERE doc_id = 1"
+        ).fetchone()
+        assert count == 0
+        # Replacing in one go; the id of document 3 is reused.
+        library.add("2.pdf", "new", tokenize(SOURCES[0]), replaces=[3])
+        assert [doc.sha256 for doc in library.find_path("2.pdf")] == ["new"]
+        assert set(library.query(analysis).keys()) == {2, 3}
+        assert library.free_fraction() > 0
+        library.compact()
+        assert library.free_fraction() == 0
+        assert set(library.query(analysis).keys()) == {2, 3}
+
+
+def test_library_token_cache(tmp_path):
+    path = str(tmp_path / "library.db")
+    analysis = tokenize(SOURCES[0])
+    with Library(path, ngram_size=3, cache_size=8) as library:
+        library.add("0.pdf", "0", tokenize(SOURCES[0]))
+        assert set(library.query(analysis).keys()) == {1}
+        # Changed by another connection, which reuses the id.
+        with Library(path) as other:
+            other.add("1.pdf", "1", tokenize(SOURCES[1]), replaces=[1])
+        assert library.query(analysis) == {}
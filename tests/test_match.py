@@ -1,9 +1,26 @@
+import hashlib
+import os
+
+import pytest
+
+import copymatch
 from copymatch import (
+    Span,
     State,
+    hash_path,
+    hash_paths,
+    make_automaton,
     make_state,
     match_text,
+    match_text_automaton,
+    match_windows,
+    match_windows_automaton,
+    merge_spans,
+    merge_windows,
     normalize,
+    page_numbers,
     parse_page_range,
+    punct_table,
     tokenize,
 )
 
@@ -14,6 +31,46 @@ def test_match():
     assert [result.pos for result in results] == [1, 2, 3]
 
 
+def test_match_automaton():
+    base = make_automaton(tokenize("hello world and goodbye"), 2)
+    results = match_text_automaton(base, tokenize("this is the world and goodbye"))
+    assert [result.pos for result in results] == [1, 2, 3]
+
+
+def test_match_automaton_same_as_match_text():
+    analysis = tokenize(
+        """the cat sat on the mat and the cat sat on the hat while the
+        dog sat on the mat and the the cat cat"""
+    )
+    source = tokenize("a cat sat on the the mat but the dog sat on the hat the cat")
+    for n in (1, 2, 3, 4):
+        assert match_text_automaton(make_automaton(analysis, n), source) == match_text(
+            make_state(analysis, n), source
+        )
+
+
+def test_match_spans():
+    analysis = tokenize("a b c d e f and a b c")
+    source = tokenize("x b c d e y c d e f z a b c")
+    expected = [
+        Span(1, 5, 1, 5),
+        Span(1, 3, 8, 10),
+        Span(6, 10, 2, 6),
+        Span(11, 14, 0, 3),
+        Span(11, 14, 7, 10),
+    ]
+    for make, match in (
+        (make_state, match_windows),
+        (make_automaton, match_windows_automaton),
+    ):
+        spans = list(merge_windows(match(make(analysis, 2), source)))
+        assert (
+            sorted(spans, key=lambda span: (span.source_start, span.analysis_start))
+            == expected
+        )
+        assert merge_spans(spans) == [(0, 6), (7, 10)]
+
+
 def test_make_state():
     fsa = make_state(tokenize("hello world and goodbye"), 2)
     assert set(fsa.transitions.keys()) == {"hello", "world", "and", "goodbye"}
@@ -59,7 +116,61 @@ def test_normalize():
     assert normalize("‘hello’") == "hello"
 
 
+def test_punct_table_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    punct_table.cache_clear()
+    table = punct_table()
+    assert ord("’") in table and ord("a") not in table
+    assert len(list(tmp_path.glob("punct-*.txt"))) == 1
+    punct_table.cache_clear()
+    assert punct_table() == table
+    # A cache directory that cannot be made only means no caching.
+    (tmp_path / "file").write_text("")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "file" / "cache"))
+    punct_table.cache_clear()
+    assert punct_table() == table
+    punct_table.cache_clear()
+
+
 def test_page_range():
     assert list(parse_page_range("1-2")) == [1, 2]
     assert list(parse_page_range("1,2")) == [1, 2]
     assert list(parse_page_range("1,2-5,8")) == [1, 2, 3, 4, 5, 8]
+
+
+def test_hash_paths(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    paths = []
+    for n in range(3):
+        path = tmp_path / f"{n}.txt"
+        path.write_bytes(str(n).encode() * 100000)
+        paths.append(str(path))
+    expected = [hashlib.sha256(str(n).encode() * 100000).hexdigest() for n in range(3)]
+    assert hash_paths(paths, jobs=2) == expected
+
+    def hash_file(path):
+        hashed.append(path)
+        return hashlib.sha256(open(path, "rb").read()).hexdigest()
+
+    hashed = []
+    monkeypatch.setattr(copymatch, "hash_file", hash_file)
+    assert hash_path(paths[1]) == expected[1]
+    assert hashed == []
+    with open(paths[1], "ab") as f:
+        f.write(b"!")
+    os.utime(paths[1], ns=(0, 0))
+    assert hash_path(paths[1]) != expected[1]
+    assert hashed == [paths[1]]
+
+
+def test_page_numbers():
+    assert page_numbers("3-5,1,4") == (0, 2, 3, 4)
+    with pytest.raises(ValueError):
+        page_numbers("0-2")
+
+
+def test_normalize_interned():
+    # Built at run time, so that neither is a constant interned already.
+    token = normalize("".join(["Ca", "fé"]))
+    assert token == "cafe\u0301"
+    assert normalize("CAFE\u0301".lower()) is token
@@ -0,0 +1,93 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from copymatch import hash_path
+from copymatch.cache import ParsrCache
+from copymatch.parsr_batch import ParsrBatchClient
+
+
+class StubParsr(BaseHTTPRequestHandler):
+    """Just enough of the Parsr API, where each job takes a few polls."""
+
+    jobs: dict = {}
+    # Makes the JSON of a document from its words, set by each test.
+    parsr_json = None
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def send(self, status, body):
+        data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        name = re.search(rb'name="file"; filename="([^"]+)"', body).group(1).decode()
+        cls = type(self)
+        with cls.lock:
+            job_id = f"job{len(cls.jobs)}"
+            cls.jobs[job_id] = {"name": name, "polls": 3}
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        self.send(202, job_id)
+
+    def do_GET(self):
+        cls = type(self)
+        _, _, _, endpoint, job_id = self.path.split("/")
+        job = cls.jobs[job_id]
+        if endpoint == "queue":
+            with cls.lock:
+                job["polls"] -= 1
+                if job["polls"] == 0:
+                    cls.in_flight -= 1
+            if job["polls"] > 0:
+                self.send(200, {"id": job_id, "progress-percentage": 50})
+            else:
+                self.send(201, {"id": job_id})
+        else:
+            words = job["name"].split(".")[0].split("_")
+            self.send(200, type(self).parsr_json(words))
+
+    def log_message(self, *args):
+        pass
+
+
+def test_parsr_batch_client(tmp_path, monkeypatch, mk_parsr_json):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(StubParsr, "parsr_json", staticmethod(mk_parsr_json))
+    server = ThreadingHTTPServer(("localhost", 0), StubParsr)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config = tmp_path / "config.json"
+    config.write_text("{}")
+    paths = []
+    for n in range(6):
+        path = tmp_path / f"hello_world_{n}.pdf"
+        path.write_bytes(str(n).encode())
+        paths.append(str(path))
+    cache = ParsrCache(tmp_path / "parsr.db")
+    client = ParsrBatchClient(
+        f"localhost:{server.server_address[1]}",
+        config_path=str(config),
+        max_in_flight=3,
+        poll_min=0.01,
+        cache=cache,
+    )
+    try:
+        assert client.process_all(paths) == {path: None for path in paths}
+        assert StubParsr.max_in_flight == 3
+        assert [row[0] for row in cache.get(hash_path(paths[4]))] == [
+            "hello",
+            "world",
+            "4",
+        ]
+        # Already cached, so nothing is sent again.
+        assert client.process_all(paths[:2]) == {path: None for path in paths[:2]}
+        assert len(StubParsr.jobs) == 6
+    finally:
+        client.close()
+        server.shutdown()
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from copymatch import extract_words, hash_path
+from copymatch.copymatch import init_serve_worker, serve_match
+from copymatch.library import Library
+from copymatch.server import WorkerPool, make_server, parse_address
+
+
+def test_serve(tmp_path, monkeypatch, analysis_text, source_texts, make_pdf):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    library_path = str(tmp_path / "library.db")
+    with Library(library_path, ngram_size=4) as library:
+        for n, text in enumerate(source_texts):
+            path = make_pdf(tmp_path / f"source{n}.pdf", text)
+            library.add(path, hash_path(path), extract_words(path), title=f"source{n}")
+    with open(make_pdf(tmp_path / "analysis.pdf", analysis_text), "rb") as f:
+        data = f.read()
+    pool = WorkerPool(
+        serve_match, 2, 0, init_serve_worker, (library_path, 8, extract_words, ())
+    )
+    server = make_server("localhost:0", pool)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://localhost:{server.server_address[1]}"
+
+    def post(path: str, body: bytes):
+        request = urllib.request.Request(f"{url}{path}", data=body, method="POST")
+        with urllib.request.urlopen(request) as response:
+            return response.headers["Content-Type"], response.read()
+
+    try:
+        content_type, body = post("/match", data)
+        assert content_type == "application/json"
+        result = json.loads(body)
+        assert [doc["title"] for doc in result["documents"]] == ["source0", "source1"]
+        assert result["documents"][0]["spans"] == [[1, 10, 0, 9]]
+        content_type, body = post("/match?annotate=1", data)
+        assert content_type == "application/pdf"
+        assert body.startswith(b"%PDF")
+        try:
+            post("/match", b"not a pdf")
+            assert False
+        except urllib.error.HTTPError as e:
+            assert e.code == 422
+        with urllib.request.urlopen(f"{url}/status") as response:
+            assert json.load(response)["done"] == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+        pool.shutdown()
+
+
+def echo_match(body: bytes, params):
+    if "exit" in params:
+        os._exit(1)
+    return "text/plain", body
+
+
+def test_serve_worker_failure():
+    pool = WorkerPool(echo_match, 1, 0, os.getpid, ())
+    server = make_server("localhost:0", pool)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://localhost:{server.server_address[1]}"
+    try:
+        request = urllib.request.Request(f"{url}/match?exit=1", data=b"x")
+        try:
+            urllib.request.urlopen(request)
+            assert False
+        except urllib.error.HTTPError as e:
+            assert e.code == 500
+        # New workers take over.
+        with urllib.request.urlopen(f"{url}/match", data=b"hello") as response:
+            assert response.read() == b"hello"
+    finally:
+        server.shutdown()
+        server.server_close()
+        pool.shutdown()
+
+
+def test_parse_address():
+    assert parse_address("localhost:8765") == ("localhost", 8765)
+    assert parse_address("unix:/tmp/copymatch.sock") == "/tmp/copymatch.sock"
+    assert parse_address("unix:relative:name") == "relative:name"
+    for address in ["copymatch.sock", "localhost:http", "unix:"]:
+        with pytest.raises(ValueError):
+            parse_address(address)
@@ -0,0 +1,70 @@
+from copymatch import (
+    extract_pdf_words,
+    extract_words,
+    make_state,
+    match_windows,
+    normalize,
+    stats,
+)
+from copymatch.copymatch import match_sources
+from copymatch.stats import Stats
+
+
+def test_stats():
+    collected = Stats()
+    with stats.hook(collected):
+        assert stats.enabled()
+        for path in ["a.pdf", "b.pdf", "a.pdf"]:
+            with stats.stage("match", path=path):
+                pass
+        with stats.stage("total"):
+            stats.count("tokens", 5, path="a.pdf")
+            stats.count("tokens", 3)
+    assert not stats.enabled()
+    stats.count("tokens", 100)
+    report = collected.report()
+    assert report["stages"]["match"]["count"] == 3
+    assert report["stages"]["total"]["count"] == 1
+    assert sorted(report["documents"]) == ["a.pdf", "b.pdf"]
+    assert report["documents"]["a.pdf"]["tokens"] == 5
+    assert "match" in report["documents"]["b.pdf"]["stages"]
+    assert report["counters"] == {"tokens": 8}
+    assert report["caches"]["words"]["hit_rate"] is None
+    assert report["peak_rss_mib"]["self"] > 0
+
+
+def test_stats_recording():
+    with stats.recording() as events:
+        with stats.stage("extract", path="a.pdf"):
+            stats.count("tokens", 2, path="a.pdf")
+    assert [event for event, _ in events] == ["count", "stage"]
+    collected = Stats()
+    with stats.hook(collected):
+        stats.replay(events)
+    assert collected.report()["documents"]["a.pdf"]["tokens"] == 2
+
+
+def test_stats_cache_and_workers(
+    tmp_path, monkeypatch, analysis_text, source_texts, make_pdf
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    analysis_path = make_pdf(tmp_path / "analysis.pdf", analysis_text)
+    paths = [
+        make_pdf(tmp_path / f"source{n}.pdf", text)
+        for n, text in enumerate(source_texts)
+    ]
+    normalize.cache_clear()
+    collected = Stats()
+    with stats.hook(collected):
+        extract_words(analysis_path)
+        extract_words(analysis_path)
+        base = make_state(extract_pdf_words(analysis_path), 4)
+        # Events of the workers are sent back to the main process.
+        list(match_sources(paths, 2, base, match_windows, extract_words, 0))
+    report = collected.report()
+    assert report["caches"]["words"] == {"hits": 1, "misses": 4, "hit_rate": 0.2}
+    # "the" comes up four times in the analysis text alone.
+    assert report["caches"]["normalize"]["hits"] >= 3
+    assert report["stages"]["match"]["count"] == 3
+    assert report["stages"]["extract"]["count"] == 4
+    assert set(report["documents"]) == {analysis_path, *paths}
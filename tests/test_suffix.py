@@ -0,0 +1,56 @@
+import random
+
+from copymatch import make_state, match_text, tokenize
+from copymatch.suffix import (
+    make_suffix_automaton,
+    match_text_suffix,
+    match_windows_suffix,
+)
+
+
+def test_match_windows_suffix():
+    rng = random.Random(0)
+    for _ in range(500):
+        analysis = tokenize(" ".join(rng.choices("abc", k=rng.randint(1, 30))))
+        source = tokenize(" ".join(rng.choices("abcd", k=rng.randint(1, 30))))
+        n = rng.randint(1, 4)
+        automaton = make_suffix_automaton(analysis, n)
+        assert match_text_suffix(automaton, source) == match_text(
+            make_state(analysis, n), source
+        )
+        # Every window is a run that cannot be made longer.
+        for start, end, analysis_starts in match_windows_suffix(automaton, source):
+            assert end - start >= n
+            for analysis_start in analysis_starts:
+                analysis_end = analysis_start + end - start
+                assert [word.token for word in source[start:end]] == [
+                    word.token for word in analysis[analysis_start:analysis_end]
+                ]
+                assert (
+                    start == 0
+                    or analysis_start == 0
+                    or source[start - 1].token != analysis[analysis_start - 1].token
+                )
+                assert (
+                    end == len(source)
+                    or analysis_end == len(analysis)
+                    or source[end].token != analysis[analysis_end].token
+                )
+
+
+def test_match_suffix():
+    analysis = tokenize(
+        """the quick brown fox jumps over the lazy dog while a stitch in time
+        saves nine and the early bird catches the worm"""
+    )
+    source = tokenize(
+        """yesterday the quick brown fox jumps over the lazy dog again and
+        they say a stitch in time saves nine and the early bird wins"""
+    )
+    automaton = make_suffix_automaton(analysis, 4)
+    windows = list(match_windows_suffix(automaton, iter(source)))
+    # One window per copied passage rather than one per 4-gram.
+    assert [(start, end) for start, end, _ in windows] == [(1, 10), (14, 24)]
+    assert match_text_suffix(automaton, source) == match_text(
+        make_state(analysis, 4), source
+    )
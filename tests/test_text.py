@@ -0,0 +1,63 @@
+from copymatch import (
+    extract_pdf_words,
+    extract_words,
+    make_state,
+    match_windows,
+    normalize,
+)
+from copymatch.copymatch import match_sources
+from copymatch.text import extract_text_words, text_words
+
+TEXT = "Ça  va?\n\tDon't — stop—the “quick” brown fox’s ﬁne café... x-\nray  "
+
+
+def test_text_words():
+    pieces = TEXT.split()
+    expected = [
+        (pos, normalize(piece))
+        for pos, piece in enumerate(pieces)
+        if normalize(piece) != ""
+    ]
+    assert [(word.pos, word.token) for word in text_words([TEXT])] == expected
+    # Words cut off at the end of a chunk come out whole.
+    for size in range(1, len(TEXT)):
+        chunks = [TEXT[start : start + size] for start in range(0, len(TEXT), size)]
+        assert [(word.pos, word.token) for word in text_words(chunks)] == expected
+    assert [word.token for word in text_words([TEXT]) if word.ended_in_hyphen] == ["x"]
+
+
+def test_html_words(tmp_path):
+    path = tmp_path / "source.html"
+    path.write_text(
+        """<html><head><title>Not text</title><style>p { x: y }</style></head>
+        <body><p>Fish &amp; chips</p><p>in<em>line</em> words</p><br>split<script>
+        var x = "<p>";</script></body></html>"""
+    )
+    assert [word.token for word in extract_text_words(str(path))] == [
+        "fish",
+        "chips",
+        "inline",
+        "words",
+        "split",
+    ]
+
+
+def test_match_text_sources(
+    tmp_path, monkeypatch, analysis_text, source_texts, make_pdf
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    base = make_state(
+        extract_pdf_words(make_pdf(tmp_path / "analysis.pdf", analysis_text)), 4
+    )
+    pdfs = [
+        make_pdf(tmp_path / f"source{n}.pdf", text)
+        for n, text in enumerate(source_texts)
+    ]
+    texts = []
+    for n, text in enumerate(source_texts):
+        texts.append(str(tmp_path / f"source{n}.txt"))
+        with open(texts[-1], "w") as f:
+            f.write(text)
+    from_pdfs = match_sources(pdfs, 1, base, match_windows, extract_words, 0)
+    from_texts = match_sources(texts, 1, base, match_windows, extract_words, 0)
+    assert [spans for _, _, spans in from_texts] == [spans for _, _, spans in from_pdfs]
@@ -0,0 +1,47 @@
+import numpy as np
+
+from copymatch import merge_windows, span_words, tokenize, vectorized
+from copymatch.fingerprint import make_index, match_text_index, match_windows_index
+from copymatch.vectorized import (
+    make_vector_index,
+    match_text_vector,
+    match_windows_vector,
+    ngram_hashes,
+)
+
+
+def test_ngram_hashes():
+    starts, hashes = ngram_hashes(np.array([1, 2, 3, 1, 2, -1, 1, 2]), 2)
+    assert starts.tolist() == [0, 1, 2, 3, 6]
+    assert hashes[0] == hashes[3] == hashes[4]
+    assert hashes[0] != hashes[1]
+    assert len(ngram_hashes(np.array([1]), 2)[0]) == 0
+
+
+def test_match_vector_same_as_index():
+    analysis = tokenize(
+        """the cat sat on the mat and the cat sat on the hat while the
+        dog sat on the mat and the the cat cat"""
+    )
+    source = tokenize("a cat sat on the mat but the dog sat on the hat the cat cat")
+    for n in (1, 2, 3, 4):
+        index = make_index(analysis, n)
+        vector_index = make_vector_index(analysis, n)
+        assert vector_index.vocabulary == index.vocabulary
+        assert list(match_windows_vector(vector_index, source)) == list(
+            match_windows_index(index, source)
+        )
+        assert match_text_vector(vector_index, source) == match_text_index(
+            index, source
+        )
+
+
+def test_match_vector_chunks(monkeypatch):
+    analysis = tokenize("one two three four five six seven eight")
+    source = tokenize("zero one two three four five six seven eight nine")
+    expected = match_text_vector(make_vector_index(analysis, 3), source)
+    assert len(expected) == 8
+    for chunk_size in (1, 2, 4):
+        monkeypatch.setattr(vectorized, "CHUNK_SIZE", chunk_size)
+        windows = match_windows_vector(make_vector_index(analysis, 3), iter(source))
+        assert span_words(analysis, merge_windows(windows)) == expected
@@ -0,0 +1,58 @@
+import fitz
+
+from copymatch import (
+    PDFWord,
+    compiled_lexicon,
+    lexicon,
+    merge_hyphenated,
+    normalization_version,
+    normalize,
+)
+from copymatch.wordlist import Lexicon, compile_lexicon
+
+
+def test_lexicon(tmp_path):
+    compile_lexicon(["zebra", "apple", "", "über", "apple", "mango"], tmp_path / "a")
+    compile_lexicon(["kiwi"], tmp_path / "b")
+    compile_lexicon([], tmp_path / "c")
+    words = Lexicon(tmp_path / "a")
+    assert list(words) == ["apple", "mango", "zebra", "über"]
+    assert len(words) == 4
+    for word in words:
+        assert word in words
+    for word in ["", "a", "apples", "kiwi", "zzz", "ü", 1]:
+        assert word not in words
+    both = Lexicon(tmp_path / "a", tmp_path / "b", tmp_path / "c")
+    assert "kiwi" in both and "über" in both
+    assert len(both) == 5
+
+
+def test_merge_hyphenated_lexicon(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    word_list = tmp_path / "de.txt"
+    word_list.write_text("Straßenbahn\nHaltestelle\n", encoding="utf-8")
+    words = [
+        PDFWord(
+            token=normalize(token),
+            pos=pos,
+            ended_in_hyphen=hyphen,
+            rects=(fitz.Rect(0, 0, 1, 1), None),
+            page_no=0,
+            block_no=0,
+            line_no=pos,
+            word_no=0,
+        )
+        for pos, (token, hyphen) in enumerate(
+            [("Straßen-", True), ("bahn", False), ("Halte-", True), ("Zeit", False)]
+        )
+    ]
+    lexicons = (str(word_list),)
+    merged = merge_hyphenated(words, lexicons)
+    assert [word.token for word in merged] == ["strassenbahn", "halte", "zeit"]
+    assert merged[0].rects[1] == words[1].rects[0]
+    # Compiled once and then used as is.
+    compiled = compiled_lexicon(str(word_list))
+    assert compiled.parent == tmp_path
+    # Compiled again if normalization changes.
+    assert normalization_version() in compiled.name
+    assert list(lexicon((str(compiled),))) == list(lexicon(lexicons))